@@ -0,0 +1,58 @@
+"""
+Compares the compiled right expressions against the RightExprModel visitor
+on deep concat and filter expressions.
+
+    python benchmarks/bench_compiled.py --depth 200 --repeat 200
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution.execution')
+
+
+def create_source(depth):
+    lines = ['a = {"x": "p", "y": "q"}']
+    concat = ' + '.join(['a'] + ['"s{:d}"'.format(i) for i in range(depth)])
+    lines.append('show {:s}'.format(concat))
+    filtered = 'a'
+    for i in range(depth):
+        filtered = '({:s} + "f{:d}"){{"x", "y"}}'.format(filtered, i)
+    lines.append('show {:s}'.format(filtered))
+    return '\n'.join(lines) + '\n'
+
+
+def measure(evaluate, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        evaluate()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compiled against visited right expressions.')
+    parser.add_argument('--depth', type=int, default=200, help='The number of operators in each expression.')
+    parser.add_argument('--repeat', type=int, default=200, help='The number of evaluations per measurement.')
+    opts = parser.parse_args()
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), opts.depth * 20))
+    stmts = fastparser.FastStringParser(create_source(opts.depth)).parse()
+    model = model_module.Model(True)
+    context = model_module.Context(model_module.ModuleBuilder())
+    execution_model = execution.ExecutionModel(model, context)
+    execution_model.visit(stmts[0])
+
+    for name, stmt in zip(['concat', 'filter'], stmts[1:]):
+        visited = measure(lambda: execution.RightExprModel(model, context).visit(stmt.body), opts.repeat)
+        compiled = measure(lambda: execution_model.evaluate(stmt.body), opts.repeat)
+        print('{:s} depth {:d}: visitor {:.1f} us, compiled {:.1f} us, speedup {:.2f}x'.format(name, opts.depth, visited * 1e6, compiled * 1e6, visited / compiled))
+
+
+if __name__ == '__main__':
+    main()
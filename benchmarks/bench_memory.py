@@ -0,0 +1,63 @@
+"""
+Measures the memory per name of a synthetic library in the regular entity
+layout, with one ContentEntity per name, and in the compact layout of
+ContentGroupEntity and ContentListEntity.
+
+    python benchmarks/bench_memory.py --names 1000000
+"""
+import argparse
+import gc
+import importlib
+import os
+import sys
+import tracemalloc
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+entity_module = importlib.import_module('naming-protocol.model.entity')
+
+
+def build_regular(contents, width):
+    library = entity_module.GroupEntity()
+    for start in range(0, len(contents), width):
+        group = entity_module.GroupEntity()
+        for index, content in enumerate(contents[start:start + width]):
+            group.set_by_key('n{:d}'.format(index), entity_module.ContentEntity(content))
+        library.set_by_key('g{:d}'.format(start // width), group)
+    return library.freeze()
+
+
+def build_compact(contents, width):
+    library = entity_module.GroupEntity()
+    for start in range(0, len(contents), width):
+        pairs = (('n{:d}'.format(index), entity_module.ContentEntity(content)) for index, content in enumerate(contents[start:start + width]))
+        library.set_by_key('g{:d}'.format(start // width), entity_module.build_group_entity(pairs))
+    return library.freeze()
+
+
+def measure(build, contents, width):
+    gc.collect()
+    tracemalloc.start()
+    library = build(contents, width)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return library, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory of regular against compact entities.')
+    parser.add_argument('--names', type=int, default=1000000, help='The number of names in the library.')
+    parser.add_argument('--width', type=int, default=1000, help='The number of names per group.')
+    opts = parser.parse_args()
+
+    # The strings themselves are built beforehand and not counted; the keys are.
+    contents = ['name{:d}'.format(index) for index in range(opts.names)]
+    for name, build in [('regular', build_regular), ('compact', build_compact)]:
+        library, size = measure(build, contents, opts.width)
+        print('{:s}: {:.1f} MB, {:.1f} bytes per name'.format(name, size / 1e6, size / opts.names))
+        del library
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Measures the query throughput of a ModuleSnapshot shared by several threads.
+Every thread runs the same query program against its own context and model,
+and its output is checked against a run on the main thread.
+
+    python benchmarks/bench_threads.py --names 1000 --queries 200 --threads 1 2 4 8
+"""
+import argparse
+import importlib
+import io
+import os
+import sys
+import threading
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+QUERY = '''scope q begin
+    use prefix + nouns @ ''
+    use verbs + nouns
+    validate
+end
+show (verbs | nouns){'g', 's'} + suffix
+'''
+
+
+def create_library(names):
+    lines = [
+        'prefix = \'get\'',
+        'verbs = {\'g\': <\'get\', past=\'got\'>, \'s\': <\'set\', past=\'set\'>, \'l\': \'load\'}',
+        'suffix = {\'x\': \'all\', \'y\': \'one\'}',
+        'nouns = {{{:s}}}'.format(', '.join('\'n{:d}\': \'noun{:d}\''.format(index, index) for index in range(names))),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def run_query(snapshot, stmts):
+    output = io.StringIO()
+    execution_model = execution.ExecutionModel(snapshot.get_model(), snapshot.create_context(), output=output)
+    for stmt in stmts:
+        execution_model.visit(stmt)
+    return output.getvalue()
+
+
+def work(snapshot, stmts, queries, expected, errors):
+    try:
+        for _ in range(queries):
+            if run_query(snapshot, stmts) != expected:
+                raise AssertionError('Output differs from the main thread.')
+    except Exception as exc_value:
+        errors.append(exc_value)
+
+
+def measure(snapshot, stmts, queries, expected, threads):
+    errors = []
+    workers = [threading.Thread(target=work, args=(snapshot, stmts, queries, expected, errors)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * queries / (time.perf_counter() - started), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the throughput of a snapshot queried by several threads.')
+    parser.add_argument('--names', type=int, default=1000, help='The number of nouns in the library.')
+    parser.add_argument('--queries', type=int, default=200, help='The number of queries per thread.')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help='The thread counts to measure.')
+    opts = parser.parse_args()
+
+    model = model_module.Model(True)
+    context = model_module.Context(model_module.ModuleBuilder())
+    execution_model = execution.ExecutionModel(model, context, output=io.StringIO())
+    for stmt in fastparser.FastStringParser(create_library(opts.names)).parse():
+        execution_model.visit(stmt)
+    snapshot = model_module.ModuleSnapshot(context.stack[0])
+
+    stmts = fastparser.FastStringParser(QUERY).parse()
+    expected = run_query(snapshot, stmts)
+    for threads in opts.threads:
+        throughput, errors = measure(snapshot, stmts, opts.queries, expected, threads)
+        print('{:d} threads: {:.0f} queries/s{:s}'.format(threads, throughput, '' if not errors else ', {:d} errors: {!r}'.format(len(errors), errors[0])))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
 import argparse
+import concurrent.futures
 import sys
 from .parser import *
+from .fastparser import *
 from .cst2ast import CST2AST
-from .model import Model, Context, ModuleBuilder
+from .cache import ASTCache
+from .model import Model, Context, ModuleBuilder, CollisionReport, RecordExporter, NameTableBuilder, EntityStoreBuilder, EntityStore
 from .execution import ExecutionModel
+from .server import Daemon
+from .watch import WatchedFile, Watcher
+
+
+OUTPUT_BUFFER_SIZE = 1 << 16
 
 
 class Opts:
@@ -14,7 +22,37 @@ class Opts:
         parser.add_argument('-i', '--input', default=None, help='The path to the input file. Use stdin by default.')
         parser.add_argument('-d', '--dep', action='append', default=[], help='Imported file.')
         parser.add_argument('-o', '--output', default=None, help='The path to the output file. Use stdout by default.')
-        return cls(**parser.parse_args(arguments).__dict__)
+        parser.add_argument('-p', '--parser', choices=['antlr', 'fast'], default='antlr', help='The parser implementation. Use the ANTLR reference parser by default.')
+        parser.add_argument('-s', '--stream', action='store_true', help='Parse and execute the input one top-level statement line at a time. Needs --parser fast.')
+        parser.add_argument('--immutable', action='store_true', help='Freeze entities once built and share equal content and individual entities. Assigning into an entity built earlier, as in g[\'k\'] = \'v\', is then an error.')
+        parser.add_argument('--memo-stats', action='store_true', help='Report the hits and misses of the cross memo tables.')
+        parser.add_argument('--force-ll', action='store_true', help='Parse with full LL prediction only, skipping the SLL stage of the ANTLR parser.')
+        parser.add_argument('--parse-stats', action='store_true', help='Report how often the ANTLR parser falls back from SLL to LL prediction.')
+        parser.add_argument('--cache-dir', default=None, help='The directory of the AST cache for imported files. Use ~/.cache/naming-protocol by default.')
+        parser.add_argument('--no-cache', action='store_true', help='Do not read or write the AST cache for imported files.')
+        parser.add_argument('--clear-cache', action='store_true', help='Clear the AST cache for imported files before running.')
+        parser.add_argument('--collisions', action='store_true', help='Report every name collision found by validate after the run instead of stopping at the first one.')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='The number of worker processes expanding the used entities in validate. Validate serially by default.')
+        parser.add_argument('--memory-budget', type=int, default=None, help='Validate with at most about this many MiB of names in memory, spilling sorted runs to temporary files.')
+        parser.add_argument('--show-depth', type=int, default=None, help='List the children of shown entities down to this depth only.')
+        parser.add_argument('--show-entries', type=int, default=None, help='List at most this many children of each shown container.')
+        parser.add_argument('-f', '--format', choices=['text', 'ndjson', 'csv', 'tsv'], default='text', help='The format of show, validate and invalidate results. Use the human-oriented text by default.')
+        parser.add_argument('--name-table', default=None, help='Write the validated names of every scope to this name table file.')
+        parser.add_argument('--serve', action='store_true', help='Load the imported files once and serve programs as JSON lines on stdio or on --socket.')
+        parser.add_argument('--socket', default=None, help='The path of the Unix socket to serve on. Use stdio by default.')
+        parser.add_argument('--watch', action='store_true', help='Keep running, and re-execute the statements affected by every change to the input and imported files.')
+        parser.add_argument('--interval', type=float, default=0.5, help='The number of seconds between two checks of the watched files.')
+        parser.add_argument('--store', default=None, help='Start from the names of this entity store file instead of an empty module.')
+        parser.add_argument('--write-store', default=None, help='Write the module names bound at the end of the run to this entity store file.')
+        args = parser.parse_args(arguments)
+        if args.watch and args.input is None:
+            parser.error('--watch needs an input file.')
+        # The ANTLR runtime buffers the whole input and all of its tokens, so it cannot stream.
+        if args.stream and args.parser != 'fast':
+            parser.error('--stream needs --parser fast.')
+        if args.name_table is not None and args.memory_budget is not None:
+            parser.error('--name-table cannot list the names that --memory-budget keeps on disk.')
+        return cls(**args.__dict__)
 
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
@@ -23,23 +61,113 @@ class Opts:
         if self.output is None:
             self.output = sys.stdout
         else:
-            self.output = open(self.output, 'w')
+            self.output = open(self.output, 'w', buffering=OUTPUT_BUFFER_SIZE)
 
         return self
 
     def close(self):
-        self.output.close()
+        if self.output is sys.stdout:
+            self.output.flush()
+        else:
+            self.output.close()
+
+
+def parse_stmts(opts, filename=None):
+    if opts.parser == 'fast':
+        if filename is None:
+            parser = FastStdinParser()
+        else:
+            parser = FastFileParser(filename)
+        return parser.parse()
+    else:
+        if filename is None:
+            parser = StdinParser(opts.force_ll)
+        else:
+            parser = FileParser(filename, opts.force_ll)
+        tree = parser.parse()
+        return CST2AST(parser.input_stream).visit(tree)
+
+
+def parse_source(opts, source):
+    if opts.parser == 'fast':
+        return FastStringParser(source).parse()
+    else:
+        parser = StringParser(source, opts.force_ll)
+        tree = parser.parse()
+        return CST2AST(parser.input_stream).visit(tree)
+
+
+def stream_stmts(opts, filename=None):
+    if filename is None:
+        parser = FastStdinParser()
+    else:
+        parser = FastFileParser(filename)
+    return parser.file_input()
+
 
+def load_stmts(opts, cache, filename):
+    if cache is None:
+        return parse_stmts(opts, filename)
 
-def analyze_file(execution_model, filename):
-    print('Analyze file \'{:s}\'.'.format(filename))
-    parser = FileParser(filename)
-    tree = parser.parse()
-    stmts = CST2AST(parser.input_stream).visit(tree)
+    with open(filename, 'rb') as f:
+        key = cache.get_key(f.read(), opts.parser)
+
+    stmts = cache.load(key)
+    if stmts is None:
+        stmts = list(parse_stmts(opts, filename))
+        cache.store(key, stmts)
+    return stmts
+
+
+def analyze_file(opts, cache, execution_model, filename, messages):
+    print('Analyze file \'{:s}\'.'.format(filename), file=messages)
+    stmts = load_stmts(opts, cache, filename)
+    execution_model.filename = filename
 
     for stmt in stmts:
         execution_model.visit(stmt)
-    print('Done.')
+    print('Done.', file=messages)
+
+
+def analyze_input(opts, execution_model, exporter, report, messages):
+    print('Read input.', file=messages)
+    if opts.stream:
+        stmts = stream_stmts(opts, opts.input)
+    else:
+        stmts = parse_stmts(opts, opts.input)
+    execution_model.filename = opts.input
+
+    # The records buffered before a failing statement are written all the same.
+    try:
+        for stmt in stmts:
+            execution_model.visit(stmt)
+    finally:
+        if exporter is not None:
+            exporter.close()
+
+    if report is not None:
+        print(file=messages)
+        for line in report.lines():
+            print(line, file=messages)
+
+
+def serve(opts, model, module_builder):
+    daemon = Daemon(model, module_builder.snapshot(), lambda source: parse_source(opts, source), opts.show_depth, opts.show_entries)
+    print('Serving on {:s}.'.format('stdio' if opts.socket is None else opts.socket), file=sys.stderr)
+    if opts.socket is None:
+        daemon.serve_stream(sys.stdin, sys.stdout)
+    else:
+        daemon.serve_unix(opts.socket)
+
+
+def watch(opts, execution_model):
+    files = [WatchedFile(path) for path in [*opts.dep, opts.input]]
+    watcher = Watcher(files, lambda source: parse_source(opts, source), execution_model, opts.interval)
+    print('Watching {:s}.'.format(', '.join(watched_file.path for watched_file in files)), file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
 
 
 def main(argv):
@@ -47,26 +175,78 @@ def main(argv):
 
     opts.open()
 
-    model = Model()
-    module_builder = ModuleBuilder()
+    model = Model(opts.immutable)
+    if opts.store is not None:
+        store = EntityStore.open(opts.store)
+    else:
+        store = None
+    module_builder = ModuleBuilder(store)
     context = Context(module_builder)
-    execution_model = ExecutionModel(model, context)
+    if opts.collisions:
+        report = CollisionReport()
+    else:
+        report = None
+    if opts.jobs > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(opts.jobs)
+    else:
+        executor = None
+    if opts.memory_budget is not None:
+        memory_budget = opts.memory_budget << 20
+    else:
+        memory_budget = None
+    if opts.format == 'text':
+        exporter = None
+    else:
+        exporter = RecordExporter(opts.output, opts.format)
+    if opts.name_table is not None:
+        name_table = NameTableBuilder()
+    else:
+        name_table = None
 
-    for dependency in opts.dep:
-        analyze_file(execution_model, dependency)
-        print()
+    cache = ASTCache(opts.cache_dir)
+    if opts.clear_cache:
+        cache.clear()
+    if opts.no_cache:
+        cache = None
 
-    print('Read input.')
-    if opts.input is None:
-        parser = StdinParser()
-        tree = parser.parse()
+    # Records and the daemon protocol own the output; the progress messages go to stderr then.
+    if exporter is None and not opts.serve:
+        messages = opts.output
     else:
-        parser = FileParser(opts.input)
-        tree = parser.parse()
-    stmts = CST2AST(parser.input_stream).visit(tree)
+        messages = sys.stderr
+    execution_model = ExecutionModel(model, context, report, executor, opts.jobs, memory_budget, opts.show_depth, opts.show_entries, exporter, name_table, messages)
 
-    for stmt in stmts:
-        execution_model.visit(stmt)
+    if opts.watch:
+        watch(opts, execution_model)
+    else:
+        for dependency in opts.dep:
+            analyze_file(opts, cache, execution_model, dependency, messages)
+            print(file=messages)
+
+        if not opts.serve:
+            analyze_input(opts, execution_model, exporter, report, messages)
+
+    if opts.serve:
+        serve(opts, model, module_builder)
+
+    if name_table is not None:
+        name_table.write(opts.name_table)
+
+    if opts.write_store is not None:
+        store_builder = EntityStoreBuilder()
+        store_builder.add_names(module_builder.snapshot())
+        store_builder.write(opts.write_store)
+
+    if opts.parse_stats:
+        sll_successes, ll_fallbacks = Parser.get_statistics()
+        print('Parse statistics: {:d} SLL successes, {:d} LL fallbacks.'.format(sll_successes, ll_fallbacks), file=sys.stderr)
+
+    if opts.memo_stats:
+        memo_hits, memo_misses = model.get_memo_statistics()
+        print('Memo statistics: {:d} hits, {:d} misses.'.format(memo_hits, memo_misses), file=sys.stderr)
+
+    if executor is not None:
+        executor.shutdown()
 
     opts.close()
 
@@ -0,0 +1 @@
+from .api import *
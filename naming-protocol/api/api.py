@@ -0,0 +1,210 @@
+import collections
+import hashlib
+import threading
+from ..parser import StringParser
+from ..fastparser import FastStringParser
+from ..cst2ast import CST2AST
+from ..ast import ShowStmtNode
+from ..model import *
+from ..execution import ExecutionModel
+
+
+__all__ = [
+    'Program',
+    'Event',
+    'Result',
+    'compile',
+    'evaluate',
+    'to_python',
+    'clear_program_cache'
+]
+
+
+PROGRAM_CACHE_SIZE = 256
+PROGRAM_CACHE = collections.OrderedDict()
+PROGRAM_CACHE_LOCK = threading.Lock()
+DEFAULT_MODEL = None
+
+
+def get_default_model():
+    global DEFAULT_MODEL
+    if DEFAULT_MODEL is None:
+        DEFAULT_MODEL = Model()
+    return DEFAULT_MODEL
+
+
+def parse(source, parser='antlr', force_ll=False):
+    if parser == 'fast':
+        return FastStringParser(source).parse()
+    elif parser == 'antlr':
+        string_parser = StringParser(source, force_ll)
+        tree = string_parser.parse()
+        return CST2AST(string_parser.input_stream).visit(tree)
+    else:
+        raise ValueError('Unknown parser \'{:s}\'.'.format(parser))
+
+
+class Event:
+    """
+    One result of show, validate or invalidate. value is the shown entity, or the validated or invalidated name.
+    """
+
+    __slots__ = ('kind', 'line_index', 'stmtcol_index', 'scope_path', 'value')
+
+    def __init__(self, kind, line_index, stmtcol_index, scope_path, value):
+        self.kind = kind
+        self.line_index = line_index
+        self.stmtcol_index = stmtcol_index
+        self.scope_path = scope_path
+        self.value = value
+
+    def __repr__(self):
+        return 'Event({!r}, {!r}, {!r}, {!r}, {!r})'.format(self.kind, self.line_index, self.stmtcol_index, self.scope_path, self.value)
+
+
+class Result:
+    """
+    What a program run produced, collected in place of the printed output.
+
+    Implements the exporter interface of ExecutionModel, so show, validate and
+    invalidate report here instead of printing.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.events = []
+        self.line_index = None
+        self.stmtcol_index = None
+
+    def set_statement(self, node):
+        self.line_index = node.line_index
+        self.stmtcol_index = node.stmtcol_index
+
+    def scope(self, scope_path):
+        pass
+
+    def name(self, event, scope_path, name):
+        self.events.append(Event(event, self.line_index, self.stmtcol_index, tuple(scope_path), name))
+
+    def show(self, model, body, max_depth=None, max_entries=None):
+        self.events.append(Event('show', self.line_index, self.stmtcol_index, None, body))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def get_shown(self):
+        return [event.value for event in self.events if event.kind == 'show']
+
+    def get_validated(self):
+        """
+        Returns the names validated by the run as a dict from dotted scope path to list of names.
+        """
+        validated = {}
+        for event in self.events:
+            if event.kind == 'validate':
+                validated.setdefault('.'.join(event.scope_path), []).append(event.value)
+        return validated
+
+    def get_names(self):
+        """
+        Returns the module-level names bound by the run, including those the context started with.
+        """
+        module_builder = self.context.stack[0]
+        names = dict(module_builder.table.base)
+        names.update(module_builder.nvmap)
+        return names
+
+
+class Program:
+    """
+    A parsed program that can be run any number of times against different contexts.
+
+    The right expressions are compiled once into their AST nodes, so running
+    the program again, with any model, skips compiling them.
+    """
+
+    def __init__(self, stmts, key=None):
+        self.stmts = list(stmts)
+        self.key = key
+
+    def create_execution_model(self, model, context, result, show_depth=None, show_entries=None):
+        return ExecutionModel(model, context, show_depth=show_depth, show_entries=show_entries, exporter=result)
+
+    def run(self, context=None, model=None):
+        """
+        Executes the program and returns its Result. Without a context the
+        program runs in a fresh module; errors raise StmtError as in the CLI.
+
+        To query a ModuleSnapshot from several threads, pass each run the
+        context and model the snapshot gives the calling thread.
+        """
+        if context is None:
+            context = Context(ModuleBuilder())
+        if model is None:
+            model = get_default_model()
+        result = Result(context)
+        execution_model = self.create_execution_model(model, context, result)
+        for stmt in self.stmts:
+            execution_model.visit(stmt)
+        return result
+
+
+def compile(source, parser='antlr', force_ll=False):
+    """
+    Parses source into a Program. Programs are cached by the hash of the
+    source, so compiling the same text again returns the same Program.
+    """
+    digest = hashlib.sha256(source.encode()).hexdigest()
+    key = parser, digest
+    with PROGRAM_CACHE_LOCK:
+        program = PROGRAM_CACHE.get(key)
+        if program is not None:
+            PROGRAM_CACHE.move_to_end(key)
+            return program
+
+    program = Program(parse(source, parser, force_ll), digest)
+    with PROGRAM_CACHE_LOCK:
+        program = PROGRAM_CACHE.setdefault(key, program)
+        if len(PROGRAM_CACHE) > PROGRAM_CACHE_SIZE:
+            PROGRAM_CACHE.popitem(last=False)
+    return program
+
+
+def clear_program_cache():
+    with PROGRAM_CACHE_LOCK:
+        PROGRAM_CACHE.clear()
+
+
+def evaluate(expr_source, context=None, model=None, parser='antlr'):
+    """
+    Evaluates one right expression against the names of context and returns the entity.
+    """
+    program = compile('show {:s}\n'.format(expr_source), parser)
+    if len(program.stmts) != 1 or not isinstance(program.stmts[0], ShowStmtNode):
+        raise ValueError('Not a single expression: {!r}.'.format(expr_source))
+    if context is None:
+        context = Context(ModuleBuilder())
+    if model is None:
+        model = get_default_model()
+    execution_model = program.create_execution_model(model, context, Result(context))
+    return execution_model.evaluate(program.stmts[0].body)
+
+
+def to_python(entity):
+    """
+    Converts an entity to plain Python values: None, str, list, and dict for
+    groups (by key) and individuals (by name).
+    """
+    if isinstance(entity, NoneEntity):
+        return None
+    elif isinstance(entity, ContentEntity):
+        return entity.content
+    elif isinstance(entity, ListEntity):
+        return [to_python(value) for index, value in entity]
+    elif isinstance(entity, GroupEntity) or isinstance(entity, IndividualEntity):
+        return {key: to_python(value) for key, value in entity}
+    else:
+        raise TypeError()
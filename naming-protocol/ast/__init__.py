@@ -1,2 +1,3 @@
 from .ast import *
 from .visitor import *
+from .literal import *
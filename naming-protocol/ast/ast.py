@@ -2,6 +2,12 @@ class ASTNode:
     def __init__(self):
         pass
 
+    def __getstate__(self):
+        # The closures compiled for execution stay with the process.
+        state = dict(vars(self))
+        state.pop('compiled', None)
+        return state
+
     def accept(self, visitor):
         return visitor.visitASTNode(self)
 
@@ -0,0 +1,35 @@
+__all__ = [
+    'integer_converter',
+    'string_converter'
+]
+
+
+def integer_converter(value):
+    return eval(value)
+
+
+def string_converter(value):
+    assert value[0] == value[-1]
+    chars = []
+    state = '<INIT>'
+    for char in value[1:-1]:
+        if state == '<INIT>':
+            if char == '\\':
+                state = '<ESCAPE>'
+            else:
+                chars.append(char)
+        elif state == '<ESCAPE>':
+            if char == '\\':
+                chars.append('\\')
+            elif char == '\'':
+                chars.append('\'')
+            elif char == '\"':
+                chars.append('\"')
+            elif char == '`':
+                chars.append('`')
+            else:
+                raise ValueError('Unrecognized escape character: \'{:s}\'.'.format(char))
+            state = '<INIT>'
+        else:
+            raise ValueError()
+    return ''.join(chars)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+
+__all__ = [
+    'ASTCache'
+]
+
+
+# Every package whose code decides the statement lists that the cache holds.
+SOURCE_PACKAGES = ['ast', 'parser', 'fastparser', 'cst2ast', 'grammar']
+
+
+def get_source_digest():
+    """
+    Hashes the sources of SOURCE_PACKAGES, so that changing the AST classes or
+    a parser invalidates the cache without anyone bumping a version.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for package in SOURCE_PACKAGES:
+        directory = os.path.join(root, package)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.py') or filename.endswith('.g4'):
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    content = f.read()
+                digest.update('{:s}/{:s}\0{:d}\0'.format(package, filename, len(content)).encode())
+                digest.update(content)
+    return digest.hexdigest()
+
+
+SOURCE_DIGEST = get_source_digest()
+MAGIC = b'NPAST\x01'
+
+
+class ASTCache:
+    """
+    On-disk cache of converted statement lists, keyed by file content hash, parser and source digest.
+
+    Each entry is a zlib-compressed pickle of the statement list prefixed with MAGIC.
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'naming-protocol')
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, content, parser='antlr'):
+        digest = hashlib.sha256()
+        digest.update(SOURCE_DIGEST.encode())
+        digest.update(b'\0')
+        digest.update(parser.encode())
+        digest.update(b'\0')
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.ast')
+
+    def load(self, key):
+        try:
+            with open(self.get_path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+
+        if not data.startswith(MAGIC):
+            self.misses += 1
+            return None
+        # A damaged or foreign entry is a miss, whatever unpickling it raises.
+        try:
+            stmts = pickle.loads(zlib.decompress(data[len(MAGIC):]))
+        except Exception:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return stmts
+
+    def store(self, key, stmts):
+        try:
+            data = MAGIC + zlib.compress(pickle.dumps(stmts, protocol=pickle.HIGHEST_PROTOCOL))
+        except (RecursionError, pickle.PicklingError, TypeError, AttributeError):
+            return False
+
+        path = self.get_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.ast') or filename.endswith('.tmp'):
+                    try:
+                        os.remove(os.path.join(root, filename))
+                    except OSError:
+                        pass
@@ -259,34 +259,3 @@ class GroupChunkConverter(BaseVisitor):
 
     def visitGroupChunk(self, ctx):
         return string_converter(ctx.key.text), self.expr_converter.visit(ctx.value)
-
-
-def integer_converter(value):
-    return eval(value)
-
-
-def string_converter(value):
-    assert value[0] == value[-1]
-    chars = []
-    state = '<INIT>'
-    for char in value[1:-1]:
-        if state == '<INIT>':
-            if char == '\\':
-                state = '<ESCAPE>'
-            else:
-                chars.append(char)
-        elif state == '<ESCAPE>':
-            if char == '\\':
-                chars.append('\\')
-            elif char == '\'':
-                chars.append('\'')
-            elif char == '\"':
-                chars.append('\"')
-            elif char == '`':
-                chars.append('`')
-            else:
-                raise ValueError('Unrecognized escape character: \'{:s}\'.'.format(char))
-            state = '<INIT>'
-        else:
-            raise ValueError()
-    return ''.join(chars)
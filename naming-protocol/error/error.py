@@ -29,3 +29,29 @@ class LeftExprError(Exception):
 
     def __str__(self):
         return 'Exception {:s}, position \'{:s}\'.'.format(type(self.exc_value).__name__, self.position)
+
+
+class ParseError(Exception):
+    def __init__(self, message, line_index, column_index):
+        super().__init__()
+        self.message = message
+        self.line_index = line_index
+        self.column_index = column_index
+
+    def __str__(self):
+        return 'Line {:d} column {:d}. {:s}'.format(self.line_index, self.column_index, self.message)
+
+
+class FrozenEntityError(Exception):
+    """
+    A write into an entity that immutable mode, a snapshot or a store has frozen.
+    """
+
+    def __init__(self, entity, kind, target):
+        super().__init__()
+        self.entity = entity
+        self.kind = kind
+        self.target = target
+
+    def __str__(self):
+        return 'Cannot set {:s} of a frozen {:s}; build a new {:s} and assign it to the name instead.'.format(self.target, self.kind, self.kind)
@@ -1,5 +1,7 @@
+import sys
 from ..error import *
-from ..ast import ASTVisitor
+from ..ast import ASTVisitor, NameAtomNode
+from ..model import TextLog
 
 
 __all__ = [
@@ -8,18 +10,55 @@ __all__ = [
 
 
 class ExecutionModel(ASTVisitor):
-    def __init__(self, model, initial_context):
+    def __init__(self, model, initial_context, report=None, executor=None, jobs=1, memory_budget=None, show_depth=None, show_entries=None, exporter=None, name_table=None, output=None):
+        """
+        The text output goes to output, or to stdout at the time of writing if output is None.
+        """
         super().__init__()
         self.model = model
         self.context = initial_context
+        self.report = report
+        self.executor = executor
+        self.jobs = jobs
+        self.memory_budget = memory_budget
+        self.show_depth = show_depth
+        self.show_entries = show_entries
+        self.exporter = exporter
+        self.name_table = name_table
+        self.filename = None
+        self.output = output
+        self.text_log = None if output is None else TextLog(output)
         self.printed = False
+        self.compiler = RightExprCompiler()
+
+    def evaluate(self, node):
+        try:
+            evaluate = node.compiled
+        except AttributeError:
+            evaluate = node.compiled = self.compiler.visit(node)
+        return evaluate(self.model, self.context)
+
+    def get_stream(self):
+        return sys.stdout if self.output is None else self.output
 
     def prepare_printing(self):
         if self.printed:
-            print()
+            print(file=self.get_stream())
         else:
             self.printed = True
 
+    def announce(self, node):
+        if self.exporter is None:
+            self.prepare_printing()
+            print('Line {:d}, statement {:d}: {:s}'.format(node.line_index, node.stmtcol_index, node.content), file=self.get_stream())
+        else:
+            self.exporter.set_statement(node)
+
+    def get_output(self):
+        if self.exporter is None:
+            return True if self.text_log is None else self.text_log
+        return self.exporter
+
     def visitGroupStmtNode(self, node):
         try:
             group_builder = self.context.push_group_builder(node.name)
@@ -37,7 +76,7 @@ class ExecutionModel(ASTVisitor):
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'pop')
 
-        group = group_builder.build()
+        group = self.model.freeze(group_builder.build())
         try:
             self.context.set_by_name(node.name, group)
         except Exception as exc_value:
@@ -66,15 +105,20 @@ class ExecutionModel(ASTVisitor):
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'pop')
 
+        if self.name_table is not None:
+            self.name_table.add(scope_processor.get_scope_path(), scope_processor.names)
+
     def visitShowStmtNode(self, node):
         try:
-            body = RightExprModel(self.model, self.context).visit(node.body)
+            body = self.evaluate(node.body)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'body')
 
-        self.prepare_printing()
-        print('Line {:d}, statement {:d}: {:s}'.format(node.line_index, node.stmtcol_index, node.content))
-        self.model.show(body)
+        self.announce(node)
+        if self.exporter is None:
+            self.model.show(body, self.show_depth, self.show_entries, self.output)
+        else:
+            self.exporter.show(self.model, body, self.show_depth, self.show_entries)
 
     def visitUnzipStmtNode(self, node):
         try:
@@ -85,12 +129,12 @@ class ExecutionModel(ASTVisitor):
         environment = self.context.top()
 
         try:
-            body = RightExprModel(self.model, self.context).visit(node.body)
+            body = self.evaluate(node.body)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'body')
 
         try:
-            environment.unzip(body)
+            environment.unzip(body, node, self.filename)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'unzip')
 
@@ -103,12 +147,12 @@ class ExecutionModel(ASTVisitor):
         scope_processor = self.context.top()
 
         try:
-            body = RightExprModel(self.model, self.context).visit(node.body)
+            body = self.evaluate(node.body)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'body')
 
         try:
-            scope_processor.use(body)
+            scope_processor.use(body, node, self.filename)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'use')
 
@@ -120,10 +164,9 @@ class ExecutionModel(ASTVisitor):
 
         scope_processor = self.context.top()
 
-        self.prepare_printing()
-        print('Line {:d}, statement {:d}: {:s}'.format(node.line_index, node.stmtcol_index, node.content))
+        self.announce(node)
         try:
-            scope_processor.validate(self.model)
+            scope_processor.validate(self.model, self.get_output(), report=self.report, executor=self.executor, jobs=self.jobs, budget=self.memory_budget)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'validate')
 
@@ -135,10 +178,9 @@ class ExecutionModel(ASTVisitor):
 
         scope_processor = self.context.top()
 
-        self.prepare_printing()
-        print('Line {:d}, statement {:d}: {:s}'.format(node.line_index, node.stmtcol_index, node.content))
+        self.announce(node)
         try:
-            scope_processor.invalidate(self.model)
+            scope_processor.invalidate(self.model, self.get_output())
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'invalidate')
 
@@ -149,7 +191,7 @@ class ExecutionModel(ASTVisitor):
             raise StmtError(exc_value, node, 'assertion')
 
         try:
-            body = RightExprModel(self.model, self.context).visit(node.body)
+            body = self.evaluate(node.body)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'body')
 
@@ -165,7 +207,7 @@ class ExecutionModel(ASTVisitor):
             raise StmtError(exc_value, node, 'left')
 
         try:
-            right = RightExprModel(self.model, self.context).visit(node.right)
+            right = self.evaluate(node.right)
         except Exception as exc_value:
             raise StmtError(exc_value, node, 'right')
 
@@ -201,17 +243,22 @@ class LeftExprModel(ASTVisitor):
 
             return body
         else:
+            # Every container on the way to the target is thawed, see Model.thaw.
             try:
-                body = RightExprModel(self.model, self.context).visit(node.body)
+                if isinstance(node.body, NameAtomNode):
+                    body = self.context.get_writable_by_name(node.body.name, self.model.thaw)
+                else:
+                    body = RightExprModel(self.model, self.context).visit(node.body)
             except Exception as exc_value:
                 raise LeftExprError(exc_value, node, 'length-pos-body')
 
             *head, tail = node.trailers
             for i, trailer in enumerate(head):
                 try:
-                    body = RightSubscriptModel(body).visit(trailer)
+                    child = RightSubscriptModel(body).visit(trailer)
+                    body = self.model.thaw_child(body, LeftSubscriptModel(self.model).visit(trailer), child)
                 except Exception as exc_value:
-                    raise LeftExprError(exc_value, node, 'length-pos-trailers[{:s}]'.format(i))
+                    raise LeftExprError(exc_value, node, 'length-pos-trailers[{:d}]'.format(i))
 
             try:
                 subscript = LeftSubscriptModel(self.model).visit(tail)
@@ -301,13 +348,8 @@ class RightExprModel(ASTVisitor):
         except Exception as exc_value:
             raise RightExprError(exc_value, node, 'right')
 
-        if not node.reverse:
-            connection = lambda x, y: x + node.connection + y
-        else:
-            connection = lambda x, y: y + node.connection + x
-
         try:
-            expr = self.model.cross(left, right, connection, node.choices)
+            expr = self.model.cross(left, right, node.connection, node.reverse, node.choices)
         except Exception as exc_value:
             raise RightExprError(exc_value, node, 'expression')
 
@@ -425,6 +467,217 @@ class RightSubscriptModel(ASTVisitor):
         return self.entity.get_by_key(node.key)
 
 
+class RightExprCompiler(ASTVisitor):
+    """
+    Compiles an expression tree once into nested closures taking the model and the context.
+
+    The closures raise RightExprError with the same nodes and positions as
+    RightExprModel, so errors read the same on both paths. They hold no model,
+    so the result is kept on the node and shared by every model running it.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    def visitUnionExprNode(self, node):
+        children = [self.visit(child) for child in node.children]
+        keeps = node.keeps
+
+        def evaluate(model, context):
+            values = []
+            for i, child in enumerate(children):
+                try:
+                    values.append(child(model, context))
+                except Exception as exc_value:
+                    raise RightExprError(exc_value, node, 'children[{:d}]'.format(i))
+
+            try:
+                return model.group_union(values, keeps)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def visitConcatExprNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        separator = node.connection
+        reverse = node.reverse
+        choices = node.choices
+
+        def evaluate(model, context):
+            try:
+                left_value = left(model, context)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'left')
+
+            try:
+                right_value = right(model, context)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'right')
+
+            try:
+                return model.cross(left_value, right_value, separator, reverse, choices)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def visitFilterExprNode(self, node):
+        body = self.visit(node.body)
+
+        if node.trailer is None:
+            return body
+
+        trailer = node.trailer
+
+        def evaluate(model, context):
+            try:
+                value = body(model, context)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'body')
+
+            try:
+                filter_trailer = FilterTrailerModel(model).visit(trailer)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'filter-trailer')
+
+            try:
+                return model.group_filter(value, filter_trailer)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def visitAtomExprNode(self, node):
+        body = self.visit(node.body)
+        trailers = [RightSubscriptCompiler().visit(trailer) for trailer in node.trailers]
+
+        if len(trailers) == 0:
+            def evaluate(model, context):
+                try:
+                    return body(model, context)
+                except Exception as exc_value:
+                    raise RightExprError(exc_value, node, 'body')
+
+            return evaluate
+
+        def evaluate(model, context):
+            try:
+                value = body(model, context)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'body')
+
+            for i, trailer in enumerate(trailers):
+                try:
+                    value = trailer(value)
+                except Exception as exc_value:
+                    raise RightExprError(exc_value, node, 'trailers[{:d}]'.format(i))
+
+            return value
+
+        return evaluate
+
+    def visitSubscriptAtomNode(self, node):
+        subscript = SubscriptAtomCompiler().visit(node.subscript)
+
+        def evaluate(model, context):
+            try:
+                return subscript(context)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def compile_pairs(self, node, create):
+        pairs = [(name, self.visit(value)) for name, value in node.pairs]
+
+        def evaluate(model, context):
+            values = []
+            for name, value in pairs:
+                try:
+                    values.append((name, value(model, context)))
+                except Exception as exc_value:
+                    raise RightExprError(exc_value, node, 'pairs[{:s}]'.format(name))
+
+            try:
+                return create(model, values)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def visitIndividualAtomNode(self, node):
+        return self.compile_pairs(node, lambda model, pairs: model.create_individual_entity(pairs))
+
+    def visitListAtomNode(self, node):
+        length = node.length
+
+        def evaluate(model, context):
+            try:
+                return model.create_list_entity(length)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def visitGroupAtomNode(self, node):
+        return self.compile_pairs(node, lambda model, pairs: model.create_group_entity(pairs))
+
+    def visitNameAtomNode(self, node):
+        name = node.name
+
+        def evaluate(model, context):
+            try:
+                return context.get_by_name(name)
+            except Exception as exc_value:
+                raise RightExprError(exc_value, node, 'expression')
+
+        return evaluate
+
+    def visitContentAtomNode(self, node):
+        content = node.content
+
+        def evaluate(model, context):
+            return model.create_content_entity(content)
+
+        return evaluate
+
+
+class RightSubscriptCompiler(ASTVisitor):
+    def __init__(self):
+        super().__init__()
+
+    def visitNameSubscriptNode(self, node):
+        name = node.name
+        return lambda entity: entity.get_by_name(name)
+
+    def visitIntegerSubscriptNode(self, node):
+        index = node.index
+        return lambda entity: entity.get_by_index(index)
+
+    def visitStringSubscriptNode(self, node):
+        key = node.key
+        return lambda entity: entity.get_by_key(key)
+
+
+class SubscriptAtomCompiler(ASTVisitor):
+    def __init__(self):
+        super().__init__()
+
+    def visitNameSubscriptNode(self, node):
+        name = node.name
+        return lambda context: context.get_by_name(name)
+
+    def visitIntegerSubscriptNode(self, node):
+        index = node.index
+        return lambda context: context.get_by_index(index)
+
+    def visitStringSubscriptNode(self, node):
+        key = node.key
+        return lambda context: context.get_by_key(key)
+
+
 class FilterTrailerModel(ASTVisitor):
     def __init__(self, model):
         super().__init__()
@@ -0,0 +1 @@
+from .fastparser import *
@@ -0,0 +1,513 @@
+import re
+import sys
+from ..error import *
+from ..ast import *
+
+
+__all__ = [
+    'FastStdinParser',
+    'FastStringParser',
+    'FastFileParser'
+]
+
+
+KEYWORDS = {
+    'group', 'scope', 'unzip', 'use', 'validate', 'invalidate', 'set', 'bind', 'collapse', 'show', 'begin', 'end', 'reverse', 'keep'
+}
+
+OPENERS = {'(', '{', '[', '<'}
+CLOSERS = {')', '}', ']', '>'}
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<NEWLINE>(?:\r?\n|\r|\f)[ \t]*)
+  | (?P<SKIP>[ \t]+|\#[^\r\n\f]*|\\[ \t]*(?:\r?\n|\r|\f))
+  | (?P<STRING>'(?:\\[\s\S]|[^\\\r\n\f'])*'|"(?:\\[\s\S]|[^\\\r\n\f"])*"|`(?:\\[\s\S]|[^\\\r\n\f`])*`)
+  | (?P<INTEGER>0[xX][0-9a-fA-F]+|0[oO][0-7]+|0[bB][01]+|[1-9][0-9]*|0+)
+  | (?P<NAME>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<OP><-|[(){}\[\]<>,;+*|=~.@:])
+''', re.VERBOSE)
+SPACES_PATTERN = re.compile(r'[ \t]+')
+
+
+class Token:
+    def __init__(self, type, text, start, stop, line, column):
+        """
+        start and stop are inclusive character offsets, as in ANTLR tokens.
+        """
+        self.type = type
+        self.text = text
+        self.start = start
+        self.stop = stop
+        self.line = line
+        self.column = column
+
+
+class FastLexer:
+    """
+    Mirrors the NEWLINE/INDENT/DEDENT handling of the lexer members in Python3.g4.
+
+    The source is either a string or a text file object. File objects are read
+    in chunks as tokens are requested, and the text before an offset passed to
+    release() is dropped, so memory stays bounded by the longest statement line.
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            self.source = None
+            self.buffer = source
+        else:
+            self.source = source
+            self.buffer = ''
+        self.base = 0
+
+    def read(self):
+        if self.source is None:
+            return False
+        chunk = self.source.read(max(self.CHUNK_SIZE, len(self.buffer)))
+        if chunk == '':
+            self.source = None
+            return False
+        self.buffer += chunk
+        return True
+
+    def release(self, offset):
+        if offset > self.base:
+            self.buffer = self.buffer[offset - self.base:]
+            self.base = offset
+
+    def get_text(self, start, stop):
+        return self.buffer[start - self.base:stop - self.base + 1]
+
+    def get_char(self, pos):
+        index = pos - self.base
+        return self.buffer[index] if index < len(self.buffer) else ''
+
+    def match(self, pattern, pos):
+        """
+        Matches at the global offset pos, reading more input until the match
+        and the two characters after it are available.
+        """
+        while True:
+            match = pattern.match(self.buffer, pos - self.base)
+            if match is not None and match.end() + 2 < len(self.buffer):
+                return match
+            if not self.read():
+                return pattern.match(self.buffer, pos - self.base)
+
+    def get_indentation_count(self, spaces):
+        count = 0
+        for ch in spaces:
+            if ch == '\t':
+                count += 8 - (count % 8)
+            else:
+                count += 1
+        return count
+
+    def tokenize(self):
+        indents = []
+        opened = 0
+        line = 1
+        line_start = 0
+        last = None
+        pos = 0
+
+        match = self.match(SPACES_PATTERN, pos)
+        if match is not None:
+            pos = len(match.group())
+            la_char = self.get_char(pos)
+            if not (self.get_char(pos + 1) != '' and la_char in '\r\n\f#'):
+                indent = self.get_indentation_count(match.group())
+                last = Token('NEWLINE', '', 0, -1, line, 0)
+                yield last
+                if indent > 0:
+                    indents.append(indent)
+                    yield Token('INDENT', match.group(), 0, pos - 1, line, 0)
+
+        while True:
+            match = self.match(TOKEN_PATTERN, pos)
+            if match is None:
+                if self.get_char(pos) == '':
+                    break
+                raise ParseError('Unrecognized character \'{:s}\'.'.format(self.get_char(pos)), line, pos - line_start)
+
+            kind = match.lastgroup
+            text = match.group()
+            start, end = pos, pos + len(text)
+            column = start - line_start
+            token_line = line
+            pos = end
+
+            newlines = text.count('\n')
+            if newlines > 0:
+                line += newlines
+                line_start = start + text.rindex('\n') + 1
+
+            if kind == 'SKIP':
+                continue
+            elif kind == 'NEWLINE':
+                la_char = self.get_char(end)
+                if opened > 0 or (self.get_char(end + 1) != '' and la_char in '\r\n\f#'):
+                    continue
+                spaces = text.lstrip('\r\n\f')
+                newline = text[:len(text) - len(spaces)]
+                indent = self.get_indentation_count(spaces)
+                previous = indents[-1] if indents else 0
+                last = Token('NEWLINE', newline, start, start + len(newline) - 1, token_line, column)
+                yield last
+                if indent > previous:
+                    indents.append(indent)
+                    yield Token('INDENT', spaces, start + len(newline), end - 1, line, 0)
+                else:
+                    while indents and indents[-1] > indent:
+                        indents.pop()
+                        yield Token('DEDENT', '', end, end - 1, line, 0)
+            else:
+                if kind == 'NAME' and text in KEYWORDS:
+                    kind = text
+                elif kind == 'OP':
+                    kind = text
+                    if text in OPENERS:
+                        opened += 1
+                    elif text in CLOSERS:
+                        opened -= 1
+                last = Token(kind, text, start, end - 1, token_line, column)
+                yield last
+
+        # Like nextToken in Python3.g4, EOF only brings a NEWLINE along when indents are still open.
+        if indents:
+            yield Token('NEWLINE', '', pos, pos - 1, line, pos - line_start)
+        while indents:
+            indents.pop()
+            yield Token('DEDENT', '', pos, pos - 1, line, pos - line_start)
+        yield Token('EOF', '<EOF>', pos, pos - 1, line, pos - line_start)
+
+
+class FastParser:
+    """
+    Hand-written recursive-descent parser for NamingProtocol.g4.
+
+    It produces the same statement nodes as CST2AST does from the ANTLR parse
+    tree, without building the parse tree in between.
+    """
+
+    def __init__(self, source):
+        self.lexer = FastLexer(source)
+        self.tokens = self.lexer.tokenize()
+        self.lookahead = []
+        self.previous = None
+
+    # Token-Stream Methods - START
+
+    def peek(self, offset=0):
+        while len(self.lookahead) <= offset:
+            self.lookahead.append(next(self.tokens))
+        return self.lookahead[offset]
+
+    def check(self, *types, offset=0):
+        return self.peek(offset).type in types
+
+    def consume(self):
+        self.peek()
+        self.previous = self.lookahead.pop(0)
+        return self.previous
+
+    def accept(self, type):
+        if self.check(type):
+            return self.consume()
+        else:
+            return None
+
+    def expect(self, type):
+        token = self.peek()
+        if token.type != type:
+            raise ParseError('Expected \'{:s}\' but found \'{:s}\'.'.format(type, token.text), token.line, token.column)
+        return self.consume()
+
+    def error(self, description):
+        token = self.peek()
+        return ParseError('Expected {:s} but found \'{:s}\'.'.format(description, token.text), token.line, token.column)
+
+    def get_text(self, start, stop):
+        return self.lexer.get_text(start.start, stop.stop)
+
+    def release(self):
+        if self.lookahead:
+            self.lexer.release(self.lookahead[0].start)
+        elif self.previous is not None:
+            self.lexer.release(self.previous.stop + 1)
+
+    # Token-Stream Methods - END
+
+    def parse(self):
+        return list(self.file_input())
+
+    # Statements
+
+    def file_input(self):
+        """
+        Yields the statements of each top-level line as soon as the line is parsed.
+        """
+        while not self.check('EOF'):
+            if self.accept('NEWLINE') is None:
+                yield from self.stmt_line()
+            self.release()
+        self.expect('EOF')
+
+    def suite(self):
+        self.expect('NEWLINE')
+        self.expect('INDENT')
+        children = []
+        while not self.check('DEDENT'):
+            children.extend(self.stmt_line())
+        self.expect('DEDENT')
+        return children
+
+    def is_group_stmt(self):
+        if self.check('group'):
+            return True
+        elif self.check('set'):
+            return self.check('group', offset=1) or (self.check('STRING', offset=1) and self.check('group', offset=2))
+        else:
+            return False
+
+    def stmt_line(self):
+        if self.is_group_stmt():
+            stmt = self.group_stmt()
+            self.expect('NEWLINE')
+            return [stmt]
+        elif self.check('scope'):
+            stmt = self.scope_stmt()
+            self.expect('NEWLINE')
+            return [stmt]
+        else:
+            chunks = [self.small_stmt()]
+            while self.accept(';') is not None:
+                if self.check('NEWLINE'):
+                    break
+                chunks.append(self.small_stmt())
+            end = self.expect('NEWLINE')
+            return [stmt_factory(self.get_text(start, stop), end.line, i) for i, (start, stop, stmt_factory) in enumerate(chunks)]
+
+    def group_stmt(self):
+        start = self.peek()
+        key = None
+        set_indicator = self.accept('set')
+        if set_indicator is not None:
+            key = self.accept('STRING')
+        self.expect('group')
+        name = self.expect('NAME')
+        begin = self.expect('begin')
+        children = self.suite()
+        self.expect('end')
+        if set_indicator is None:
+            key = None
+        elif key is None:
+            key = name.text
+        else:
+            key = string_converter(key.text)
+        return GroupStmtNode(self.get_text(start, begin), start.line, 0, name.text, children, key)
+
+    def scope_stmt(self):
+        start = self.expect('scope')
+        name = self.expect('NAME')
+        begin = self.expect('begin')
+        children = self.suite()
+        self.expect('end')
+        return ScopeStmtNode(self.get_text(start, begin), start.line, 0, name.text, children)
+
+    def small_stmt(self):
+        """
+        Returns (start token, stop token, factory), since the line index is only known at the end of the line.
+        """
+        start = self.peek()
+        if self.accept('show') is not None:
+            body = self.expr()
+            return start, self.previous, lambda content, line_index, i: ShowStmtNode(content, line_index, i, body)
+        elif self.accept('unzip') is not None:
+            body = self.expr()
+            return start, self.previous, lambda content, line_index, i: UnzipStmtNode(content, line_index, i, body)
+        elif self.accept('use') is not None:
+            body = self.expr()
+            return start, self.previous, lambda content, line_index, i: UseStmtNode(content, line_index, i, body)
+        elif self.accept('validate') is not None:
+            return start, start, lambda content, line_index, i: ValidateStmtNode(content, line_index, i)
+        elif self.accept('invalidate') is not None:
+            return start, start, lambda content, line_index, i: InvalidateStmtNode(content, line_index, i)
+        elif self.accept('set') is not None:
+            body = self.expr()
+            return start, self.previous, lambda content, line_index, i: SetStmtNode(content, line_index, i, body)
+        elif self.accept('collapse') is not None:
+            pairs = [self.keep_chunk()]
+            while self.accept(',') is not None:
+                pairs.append(self.keep_chunk())
+            return start, self.previous, lambda content, line_index, i: CollapseStmtNode(content, line_index, i, pairs)
+        else:
+            left = self.expr()
+            self.expect('=')
+            right = self.expr()
+            return start, self.previous, lambda content, line_index, i: AssignStmtNode(content, line_index, i, left, right)
+
+    def keep_chunk(self):
+        indicator = self.accept('keep') is not None
+        return indicator, self.expr()
+
+    # Expressions
+
+    def expr(self):
+        pairs = [self.union_chunk()]
+        while self.accept('|') is not None:
+            pairs.append(self.union_chunk())
+        if len(pairs) == 1:
+            (body, keeps), = pairs
+            assert len(keeps) == 0
+            return body
+        else:
+            return UnionExprNode([x for x, _ in pairs], {key: i for i, (_, keys) in enumerate(pairs) for key in keys})
+
+    def union_chunk(self):
+        body = self.concat_expr()
+        keeps = []
+        if self.check('[') and self.check('keep', offset=1):
+            self.consume()
+            self.consume()
+            keeps.append(string_converter(self.expect('STRING').text))
+            while self.accept(',') is not None:
+                keeps.append(string_converter(self.expect('STRING').text))
+            self.expect(']')
+        return body, keeps
+
+    def concat_expr(self):
+        left = self.filter_expr()
+        while self.accept('+') is not None:
+            right = self.filter_expr()
+            connection = '_'
+            reverse = False
+            if self.check('@') and self.check('reverse', 'STRING', offset=1):
+                self.consume()
+                reverse = self.accept('reverse') is not None
+                connection = string_converter(self.expect('STRING').text)
+            choices = []
+            while self.accept('@') is not None:
+                name = self.expect('NAME')
+                self.expect('=')
+                left_choice = self.expect('NAME')
+                self.expect('*')
+                right_choice = self.expect('NAME')
+                choices.append((name.text, left_choice.text, right_choice.text))
+            left = ConcatExprNode(left, right, connection, reverse, choices)
+        return left
+
+    def filter_expr(self):
+        body = self.atom_expr()
+        if self.check('{'):
+            return FilterExprNode(body, self.filter_trailer())
+        else:
+            return body
+
+    def filter_script(self):
+        body = self.subscript()
+        trailer = self.filter_trailer() if self.check('{') else None
+        return FilterScriptNode(body, trailer)
+
+    def filter_trailer(self):
+        self.expect('{')
+        children = []
+        if not self.check(';', '}'):
+            children.append(self.filter_script())
+            while self.accept(',') is not None:
+                children.append(self.filter_script())
+        common = None
+        if self.accept(';') is not None:
+            common = self.filter_trailer()
+        self.expect('}')
+        out = self.accept('~') is not None
+        return FilterTrailerNode(children, common, out)
+
+    def atom_expr(self):
+        body = self.atom()
+        trailers = []
+        while True:
+            if self.check('[') and self.check('NAME', 'INTEGER', 'STRING', offset=1):
+                self.consume()
+                trailers.append(self.subscript())
+                self.expect(']')
+            elif self.accept('.') is not None:
+                trailers.append(NameSubscriptNode(self.expect('NAME').text))
+            else:
+                break
+        return AtomExprNode(body, trailers)
+
+    def atom(self):
+        token = self.peek()
+        if self.accept('[') is not None:
+            body = self.subscript()
+            self.expect(']')
+            return SubscriptAtomNode(body)
+        elif self.accept('<') is not None:
+            if self.check('INTEGER'):
+                length = integer_converter(self.consume().text)
+                self.expect('>')
+                return ListAtomNode(length)
+            pairs = [('original', self.expr())]
+            while self.accept(',') is not None:
+                name = self.expect('NAME')
+                self.expect('=')
+                pairs.append((name.text, self.expr()))
+            self.expect('>')
+            return IndividualAtomNode(pairs)
+        elif self.accept('{') is not None:
+            pairs = []
+            while True:
+                key = self.expect('STRING')
+                self.expect(':')
+                pairs.append((string_converter(key.text), self.expr()))
+                if self.accept(',') is None:
+                    break
+            self.expect('}')
+            return GroupAtomNode(pairs)
+        elif self.accept('NAME') is not None:
+            return NameAtomNode(token.text)
+        elif self.accept('STRING') is not None:
+            return ContentAtomNode(string_converter(token.text))
+        elif self.accept('(') is not None:
+            body = self.expr()
+            self.expect(')')
+            return body
+        else:
+            raise self.error('an atom')
+
+    def subscript(self):
+        token = self.peek()
+        if self.accept('NAME') is not None:
+            return NameSubscriptNode(token.text)
+        elif self.accept('INTEGER') is not None:
+            return IntegerSubscriptNode(integer_converter(token.text))
+        elif self.accept('STRING') is not None:
+            return StringSubscriptNode(string_converter(token.text))
+        else:
+            raise self.error('a subscript')
+
+
+class FastStdinParser(FastParser):
+    def __init__(self):
+        super().__init__(sys.stdin)
+
+
+class FastStringParser(FastParser):
+    def __init__(self, content):
+        super().__init__(content)
+
+
+class FastFileParser(FastParser):
+    def __init__(self, fpath):
+        assert isinstance(fpath, str)
+        self.file = open(fpath, 'r')
+        super().__init__(self.file)
+
+    def file_input(self):
+        try:
+            yield from super().file_input()
+        finally:
+            self.file.close()
@@ -105,6 +105,15 @@ COLLAPSEOP:         '<-';
 
 // Literals
 
+// Defined here so that it comes before NUMBER and DECIMAL_INTEGER of Python3.g4,
+// which match the same text and would otherwise win the tie.
+INTEGER
+ : DECIMAL_INTEGER
+ | OCT_INTEGER
+ | HEX_INTEGER
+ | BIN_INTEGER
+ ;
+
 STRING
  : STRING_LITERAL
  ;
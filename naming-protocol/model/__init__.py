@@ -1,2 +1,9 @@
 from .context import *
 from .package import *
+from .report import *
+from .parallel import *
+from .external import *
+from .export import *
+from .nametable import *
+from .snapshot import *
+from .store import *
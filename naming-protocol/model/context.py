@@ -37,6 +37,9 @@ class Context:
     def get_by_name(self, name):
         return self.top().get_by_name(name)
 
+    def get_writable_by_name(self, name, thaw):
+        return self.top().get_writable_by_name(name, thaw)
+
     def set_by_name(self, name, value):
         return self.top().set_by_name(name, value)
 
@@ -55,7 +58,9 @@ class Context:
             raise TypeError()
 
     def pop(self):
-        return self.stack.pop()
+        holder = self.stack.pop()
+        holder.close()
+        return holder
 
     def left_subscript(self, subscript):
         holder = self.top()
@@ -1,10 +1,59 @@
-import collections
+import itertools
+import threading
+import weakref
+from ..error import FrozenEntityError
+
+
+PERMANENT_VERSION = -1
+QUOTE_TABLE = str.maketrans({'\'': '\\\''})
+CONTENT_TABLE = weakref.WeakValueDictionary()
+CONTENT_TABLE_LOCK = threading.Lock()
 
 
 class Entity:
+    """
+    Containers cache their per-depth lengths in shape. The cache of a mutable
+    container is tagged with its version, which every write to the container
+    bumps, together with the versions of the mutable containers holding it,
+    found through weak references in parents. Mutators update their own cache
+    in place. Caches computed while frozen are tagged with PERMANENT_VERSION.
+    """
+
+    __slots__ = ('mutable', '__weakref__')
+
     def __init__(self):
         self.mutable = True
 
+    def freeze(self):
+        self.mutable = False
+        return self
+
+    def __getstate__(self):
+        """
+        Pickles every slot, leaving out the weak references of parents, which only hold in this process.
+        """
+        state = {}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name != '__weakref__' and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        if 'parents' in state:
+            state['parents'] = None
+        return None, state
+
+    def check_mutable(self, target):
+        """
+        Raises FrozenEntityError before a write of target into this entity when it is frozen.
+        """
+        if not self.mutable:
+            if isinstance(self, IndividualEntity):
+                kind = 'individual'
+            elif isinstance(self, ListEntity):
+                kind = 'list'
+            else:
+                kind = 'group'
+            raise FrozenEntityError(self, kind, target)
+
     def get_content(self):
         raise NotImplementedError
 
@@ -17,11 +66,89 @@ class Entity:
     def get_by_key(self, key):
         raise NotImplementedError
 
+    def get_lengths(self):
+        if not self.is_shape_valid():
+            self.shape = self.compute_lengths()
+            self.shape_version = self.version if self.mutable else PERMANENT_VERSION
+        return list(self.shape)
+
+    def compute_lengths(self):
+        raise NotImplementedError
+
+    def is_shape_valid(self):
+        return self.shape is not None and (self.shape_version == PERMANENT_VERSION or self.shape_version == self.version)
+
+    def grow_shape(self, value):
+        """
+        Returns the shape after adding the child value, or None if the current shape is not known.
+        """
+        if not self.is_shape_valid():
+            return None
+        lengths = self.shape[1:]
+        merge_lengths(lengths, value.get_lengths())
+        return [self.shape[0] + 1, *lengths]
+
+    def store_shape(self, shape):
+        """
+        Caches shape after a write. Only a mutable entity bumps versions; a shape
+        stored on a frozen entity is permanent, so sealed entities shared
+        between threads never see a version change.
+        """
+        self.shape = shape
+        if self.mutable:
+            self.bump_version()
+            self.shape_version = self.version
+        else:
+            self.shape_version = PERMANENT_VERSION
+
+    def bump_version(self):
+        """
+        Bumps the version of this container and of every mutable container above it.
+        """
+        seen = set()
+        stack = [self]
+        while stack:
+            current = stack.pop()
+            if id(current) in seen:
+                continue
+            seen.add(id(current))
+            current.version += 1
+            if current.parents is None:
+                continue
+            live = []
+            for ref in current.parents:
+                parent = ref()
+                if parent is not None and parent.mutable:
+                    live.append(ref)
+                    stack.append(parent)
+            current.parents = live or None
+
+    def add_parent(self, parent):
+        """
+        Records that parent holds this entity, so that writes to this entity reach the cache of parent.
+        """
+        if self.mutable and parent.mutable:
+            if self.parents is None:
+                self.parents = [weakref.ref(parent)]
+            elif self.parents[-1]() is not parent:
+                self.parents.append(weakref.ref(parent))
+
     def generate_index_string(self, num_digit, index_prefix, index):
-        return index_prefix + '{{:0{:d}X}}'.format(num_digit).format(index)
+        return index_prefix + '{:0{:d}X}'.format(index, num_digit)
+
+    def iterate_labels(self):
+        """
+        Yields (label, child) pairs in the order show lists the children.
+        """
+        return iter(())
+
+    def generate_index_code(self, num_digits, index_prefix):
+        return index_prefix + '-' * sum(num_digits)
 
 
 class NoneEntity(Entity):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -31,16 +158,24 @@ class NoneEntity(Entity):
     def get_lengths(self):
         return []
 
+    def add_parent(self, parent):
+        pass
+
     def represent(self, num_digits, index_prefix, indent, prefix):
         reprs = []
         reprs.append(self.pure_represent(num_digits, index_prefix, indent, prefix))
         return reprs
 
     def pure_represent(self, num_digits, index_prefix, indent, prefix):
-        return indent, prefix, index_prefix + '0' * sum(num_digits), 'None'
+        return indent, prefix, self.generate_index_code(num_digits, index_prefix), 'None'
+
+    def generate_index_code(self, num_digits, index_prefix):
+        return index_prefix + '0' * sum(num_digits)
 
 
 class ContentEntity(Entity):
+    __slots__ = ('content',)
+
     def __init__(self, content):
         super().__init__()
         self.content = content
@@ -54,23 +189,42 @@ class ContentEntity(Entity):
     def get_lengths(self):
         return []
 
+    def add_parent(self, parent):
+        pass
+
     def represent(self, num_digits, index_prefix, indent, prefix):
         reprs = []
         reprs.append(self.pure_represent(num_digits, index_prefix, indent, prefix))
         return reprs
 
     def pure_represent(self, num_digits, index_prefix, indent, prefix):
-        return indent, prefix, index_prefix + '0' * sum(num_digits), '\'{:s}\''.format(self.content.translate(str.maketrans({'\'': '\\\''})))
+        return indent, prefix, self.generate_index_code(num_digits, index_prefix), '\'{:s}\''.format(self.content.translate(QUOTE_TABLE))
+
+    def generate_index_code(self, num_digits, index_prefix):
+        return index_prefix + '0' * sum(num_digits)
 
 
 class IndividualEntity(Entity):
+    __slots__ = ('nvmap', 'shape', 'shape_version', 'version', 'parents')
+
     def __init__(self):
         super().__init__()
-        self.nvmap = collections.OrderedDict()
+        self.nvmap = {}
+        self.shape = None
+        self.shape_version = 0
+        self.version = 0
+        self.parents = None
 
     def get_content(self):
         return self.nvmap['original'].get_content()
 
+    def freeze(self):
+        if self.mutable:
+            self.mutable = False
+            for name, value in self:
+                value.freeze()
+        return self
+
     def get_by_name(self, name, default=None):
         if default is None:
             return self.nvmap[name]
@@ -78,22 +232,19 @@ class IndividualEntity(Entity):
             return self.nvmap.get(name, default)
 
     def set_by_name(self, name, value):
+        self.check_mutable('[{:s}]'.format(name))
+        shape = None if name in self.nvmap else self.grow_shape(value)
         self.nvmap[name] = value
+        value.add_parent(self)
+        self.store_shape(shape)
 
     def __iter__(self):
         yield from self.nvmap.items()
 
-    def get_lengths(self):
+    def compute_lengths(self):
         lengths = []
         for name, value in self:
-            child = value.get_lengths()
-            for i, x in enumerate(child):
-                if len(lengths) == i:
-                    lengths.append(x)
-                else:
-                    assert len(lengths) > i
-                    if lengths[i] < x:
-                        lengths[i] = x
+            merge_lengths(lengths, value.get_lengths())
         return [len(self.nvmap), *lengths]
 
     def represent(self, num_digits, index_prefix, indent, prefix):
@@ -104,20 +255,41 @@ class IndividualEntity(Entity):
         return reprs
 
     def pure_represent(self, num_digits, index_prefix, indent, prefix):
-        return indent, prefix, 'Individual', index_prefix + '-' * sum(num_digits)
+        return indent, prefix, 'Individual', self.generate_index_code(num_digits, index_prefix)
+
+    def iterate_labels(self):
+        for name, value in self:
+            yield '[{:s}]'.format(name), value
 
 
 class ListEntity(Entity):
+    __slots__ = ('internal_list', 'shape', 'shape_version', 'version', 'parents')
+
     def __init__(self):
         super().__init__()
-        self.internal_list = list()
+        self.internal_list = []
+        self.shape = None
+        self.shape_version = 0
+        self.version = 0
+        self.parents = None
 
     def append(self, value):
+        self.check_mutable('a new item')
+        shape = self.grow_shape(value)
         self.internal_list.append(value)
+        value.add_parent(self)
+        self.store_shape(shape)
 
     def length(self):
         return len(self.internal_list)
 
+    def freeze(self):
+        if self.mutable:
+            self.mutable = False
+            for index, value in self:
+                value.freeze()
+        return self
+
     def get_by_index(self, index):
         assert 0 <= index and index < len(self.internal_list)
         return self.internal_list[index]
@@ -125,17 +297,10 @@ class ListEntity(Entity):
     def __iter__(self):
         yield from enumerate(self.internal_list)
 
-    def get_lengths(self):
+    def compute_lengths(self):
         lengths = []
         for index, value in self:
-            child = value.get_lengths()
-            for i, x in enumerate(child):
-                if len(lengths) == i:
-                    lengths.append(x)
-                else:
-                    assert len(lengths) > i
-                    if lengths[i] < x:
-                        lengths[i] = x
+            merge_lengths(lengths, value.get_lengths())
         return [len(self.internal_list), *lengths]
 
     def represent(self, num_digits, index_prefix, indent, prefix):
@@ -146,45 +311,541 @@ class ListEntity(Entity):
         return reprs
 
     def pure_represent(self, num_digits, index_prefix, indent, prefix):
-        return indent, prefix, 'List', index_prefix + '-' * sum(num_digits)
+        return indent, prefix, 'List', self.generate_index_code(num_digits, index_prefix)
+
+    def iterate_labels(self):
+        for index, value in self:
+            yield '[{:d}]'.format(index), value
 
 
 class GroupEntity(Entity):
+    __slots__ = ('internal_map', 'shape', 'shape_version', 'version', 'parents')
+
     def __init__(self):
         super().__init__()
-        self.internal_map = collections.OrderedDict()
+        self.internal_map = {}
+        self.shape = None
+        self.shape_version = 0
+        self.version = 0
+        self.parents = None
 
     def set_by_key(self, key, value):
+        self.check_mutable('[\'{:s}\']'.format(key.translate(QUOTE_TABLE)))
+        shape = None if key in self.internal_map else self.grow_shape(value)
         self.internal_map[key] = value
+        value.add_parent(self)
+        self.store_shape(shape)
 
     def items(self):
-        yield from self.internal_map.items()
+        yield from self
 
     def get_by_key(self, key):
         return self.internal_map[key]
 
+    def length(self):
+        return len(self.internal_map)
+
+    def freeze(self):
+        if self.mutable:
+            self.mutable = False
+            for key, value in self:
+                value.freeze()
+        return self
+
     def __iter__(self):
         yield from self.internal_map.items()
 
-    def get_lengths(self):
+    def compute_lengths(self):
         lengths = []
         for key, value in self:
-            child = value.get_lengths()
-            for i, x in enumerate(child):
-                if len(lengths) == i:
-                    lengths.append(x)
-                else:
-                    assert len(lengths) > i
-                    if lengths[i] < x:
-                        lengths[i] = x
+            merge_lengths(lengths, value.get_lengths())
         return [len(self.internal_map), *lengths]
 
     def represent(self, num_digits, index_prefix, indent, prefix):
         reprs = []
         reprs.append(self.pure_represent(num_digits, index_prefix, indent, prefix))
         for index, (key, value) in enumerate(self):
-            reprs.extend(value.represent(num_digits[1:], self.generate_index_string(num_digits[0], index_prefix, index), indent + 1, '[\'{:s}\']'.format(key.translate(str.maketrans({'\'': '\\\''})))))
+            reprs.extend(value.represent(num_digits[1:], self.generate_index_string(num_digits[0], index_prefix, index), indent + 1, '[\'{:s}\']'.format(key.translate(QUOTE_TABLE))))
         return reprs
 
     def pure_represent(self, num_digits, index_prefix, indent, prefix):
-        return indent, prefix, 'Group', index_prefix + '-' * sum(num_digits)
+        return indent, prefix, 'Group', self.generate_index_code(num_digits, index_prefix)
+
+    def iterate_labels(self):
+        for key, value in self:
+            yield '[\'{:s}\']'.format(key.translate(QUOTE_TABLE)), value
+
+
+class ContentListEntity(ListEntity):
+    """
+    List whose children are all plain content entities, stored as a list of
+    strings. Storing anything else switches it to the regular entity storage.
+    """
+
+    __slots__ = ('compact',)
+
+    def __init__(self, contents=()):
+        super().__init__()
+        self.internal_list = list(contents)
+        self.compact = True
+
+    def create_child(self, content):
+        return intern_content_entity(content)
+
+    def expand_storage(self):
+        if self.compact:
+            self.internal_list = [self.create_child(content) for content in self.internal_list]
+            self.compact = False
+
+    def freeze(self):
+        if self.compact:
+            self.mutable = False
+            return self
+        return super().freeze()
+
+    def append(self, value):
+        self.check_mutable('a new item')
+        if self.compact and type(value) is ContentEntity:
+            self.internal_list.append(value.content)
+            self.store_shape([len(self.internal_list)])
+        else:
+            self.expand_storage()
+            super().append(value)
+
+    def get_by_index(self, index):
+        value = super().get_by_index(index)
+        return self.create_child(value) if self.compact else value
+
+    def __iter__(self):
+        if self.compact:
+            for index, content in enumerate(self.internal_list):
+                yield index, self.create_child(content)
+        else:
+            yield from super().__iter__()
+
+    def iterate_contents(self):
+        assert self.compact
+        return iter(self.internal_list)
+
+    def compute_lengths(self):
+        if self.compact:
+            return [len(self.internal_list)]
+        return super().compute_lengths()
+
+
+class ContentGroupEntity(GroupEntity):
+    """
+    Group whose children are all plain content entities, stored as a dict of
+    strings. Storing anything else switches it to the regular entity storage.
+    """
+
+    __slots__ = ('compact',)
+
+    def __init__(self, pairs=()):
+        super().__init__()
+        self.internal_map = dict(pairs)
+        self.compact = True
+
+    def create_child(self, content):
+        return intern_content_entity(content)
+
+    def expand_storage(self):
+        if self.compact:
+            self.internal_map = {key: self.create_child(content) for key, content in self.internal_map.items()}
+            self.compact = False
+
+    def freeze(self):
+        if self.compact:
+            self.mutable = False
+            return self
+        return super().freeze()
+
+    def set_by_key(self, key, value):
+        self.check_mutable('[\'{:s}\']'.format(key.translate(QUOTE_TABLE)))
+        if self.compact and type(value) is ContentEntity:
+            self.internal_map[key] = value.content
+            self.store_shape([len(self.internal_map)])
+        else:
+            self.expand_storage()
+            super().set_by_key(key, value)
+
+    def get_by_key(self, key):
+        value = super().get_by_key(key)
+        return self.create_child(value) if self.compact else value
+
+    def __iter__(self):
+        if self.compact:
+            for key, content in self.internal_map.items():
+                yield key, self.create_child(content)
+        else:
+            yield from super().__iter__()
+
+    def iterate_contents(self):
+        assert self.compact
+        return iter(self.internal_map.values())
+
+    def compute_lengths(self):
+        if self.compact:
+            return [len(self.internal_map)]
+        return super().compute_lengths()
+
+
+class RangeListEntity(ContentListEntity):
+    """
+    Virtual list of the contents 'x0', 'x1', ... that only stores its length.
+
+    Appending to it materializes the contents first.
+    """
+
+    __slots__ = ('range_length',)
+
+    def __init__(self, length):
+        super().__init__()
+        self.range_length = length
+
+    def is_virtual(self):
+        return self.range_length is not None
+
+    def materialize(self):
+        if self.is_virtual():
+            self.internal_list = ['x{:X}'.format(index) for index in range(self.range_length)]
+            self.range_length = None
+        return self
+
+    def append(self, value):
+        self.check_mutable('a new item')
+        self.materialize()
+        super().append(value)
+
+    def length(self):
+        if self.is_virtual():
+            return self.range_length
+        return super().length()
+
+    def get_by_index(self, index):
+        if self.is_virtual():
+            assert 0 <= index and index < self.range_length
+            return self.create_child('x{:X}'.format(index))
+        return super().get_by_index(index)
+
+    def __iter__(self):
+        if self.is_virtual():
+            for index in range(self.range_length):
+                yield index, self.create_child('x{:X}'.format(index))
+        else:
+            yield from super().__iter__()
+
+    def iterate_contents(self):
+        if self.is_virtual():
+            return ('x{:X}'.format(index) for index in range(self.range_length))
+        return super().iterate_contents()
+
+    def compute_lengths(self):
+        if self.is_virtual():
+            return [self.range_length]
+        return super().compute_lengths()
+
+
+class CrossEntity:
+    """
+    Lazy result of Model.cross over a container operand.
+
+    It mirrors the structure of the left operand when side is 'left' and of
+    the right operand when side is 'right', and computes each child through
+    Model.cross_left or Model.cross_right only when it is requested. Children
+    fetched by key or index are kept so that they can be mutated in place;
+    children produced by iteration are not. Any mutation of the entity itself
+    materializes its own level first.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, model, mapping, side, left, right, connection, choices):
+        super().__init__()
+        self.model = model
+        self.mapping = mapping
+        self.side = side
+        self.left = left
+        self.right = right
+        self.connection = connection
+        self.choices = choices
+        self.body = left if side == 'left' else right
+        self.children = {}
+
+    def is_lazy(self):
+        return self.body is not None
+
+    def freeze(self):
+        """
+        Only marks this entity, since its children are computed by the model, which freezes them itself.
+        """
+        self.mutable = False
+        return self
+
+    def compute_child(self, value):
+        if self.side == 'left':
+            return self.model.cross_left(self.mapping, value, self.right, self.connection, self.choices)
+        else:
+            return self.model.cross_right(self.mapping, self.left, value, self.connection, self.choices)
+
+    def get_child(self, key, value):
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self.compute_child(value)
+            child.add_parent(self)
+        return child
+
+    def iterate_children(self):
+        for key, value in self.body:
+            child = self.children.get(key)
+            yield key, (self.compute_child(value) if child is None else child)
+
+    def get_lazy_lengths(self):
+        if self.side == 'left':
+            return self.model.cross_lengths(self.left, self.right, self.choices)
+        else:
+            return self.model.cross_right_lengths(self.left, self.right, self.choices)
+
+    def reduce_lazy(self):
+        """
+        A lazy cross pickles as its operands, so that a worker process computes
+        the children instead of the process sending it.
+        """
+        model = self.model
+        return type(model).restore_cross, (type(self), model.immutable, self.side, self.left, self.right, self.connection, self.choices, self.children, self.mutable)
+
+    def release(self):
+        self.model = self.mapping = self.left = self.right = self.connection = self.choices = self.body = None
+        self.children = {}
+
+
+class CrossListEntity(CrossEntity, ListEntity):
+    __slots__ = ('model', 'mapping', 'side', 'left', 'right', 'connection', 'choices', 'body', 'children')
+
+    def __reduce__(self):
+        if self.is_lazy():
+            return self.reduce_lazy()
+        return build_list_entity, ([value for _, value in self],)
+
+    def materialize(self):
+        if self.is_lazy():
+            self.internal_list = [value for _, value in self.iterate_children()]
+            self.release()
+            for value in self.internal_list:
+                value.add_parent(self)
+        return self
+
+    def append(self, value):
+        self.check_mutable('a new item')
+        self.materialize()
+        super().append(value)
+
+    def length(self):
+        if self.is_lazy():
+            return self.body.length()
+        return super().length()
+
+    def get_by_index(self, index):
+        if self.is_lazy():
+            return self.get_child(index, self.body.get_by_index(index))
+        return super().get_by_index(index)
+
+    def __iter__(self):
+        if self.is_lazy():
+            yield from self.iterate_children()
+        else:
+            yield from super().__iter__()
+
+    def compute_lengths(self):
+        if self.is_lazy():
+            return self.get_lazy_lengths()
+        return super().compute_lengths()
+
+
+class CrossGroupEntity(CrossEntity, GroupEntity):
+    __slots__ = ('model', 'mapping', 'side', 'left', 'right', 'connection', 'choices', 'body', 'children')
+
+    def __reduce__(self):
+        if self.is_lazy():
+            return self.reduce_lazy()
+        return build_group_entity, (list(self),)
+
+    def materialize(self):
+        if self.is_lazy():
+            self.internal_map = dict(self.iterate_children())
+            self.release()
+            for value in self.internal_map.values():
+                value.add_parent(self)
+        return self
+
+    def set_by_key(self, key, value):
+        self.check_mutable('[\'{:s}\']'.format(key.translate(QUOTE_TABLE)))
+        self.materialize()
+        super().set_by_key(key, value)
+
+    def items(self):
+        yield from self
+
+    def get_by_key(self, key):
+        if self.is_lazy():
+            return self.get_child(key, self.body.get_by_key(key))
+        return super().get_by_key(key)
+
+    def length(self):
+        if self.is_lazy():
+            return self.body.length()
+        return super().length()
+
+    def __iter__(self):
+        if self.is_lazy():
+            yield from self.iterate_children()
+        else:
+            yield from super().__iter__()
+
+    def compute_lengths(self):
+        if self.is_lazy():
+            return self.get_lazy_lengths()
+        return super().compute_lengths()
+
+
+def intern_content_entity(content):
+    """
+    Returns the one frozen content entity alive for content, so children of
+    compact containers keep their identity across accesses. The table is
+    shared by every thread; lookups need no lock, but two threads adding the
+    same content at once would each keep their own entity.
+    """
+    entity = CONTENT_TABLE.get(content)
+    if entity is None:
+        with CONTENT_TABLE_LOCK:
+            entity = CONTENT_TABLE.setdefault(content, ContentEntity(content).freeze())
+    return entity
+
+
+def build_group_entity(pairs):
+    """
+    Builds a ContentGroupEntity when every value is a plain content entity, and a GroupEntity otherwise.
+    """
+    pairs = list(pairs)
+    if all(type(value) is ContentEntity for _, value in pairs):
+        return ContentGroupEntity((key, value.content) for key, value in pairs)
+
+    entity = GroupEntity()
+    for key, value in pairs:
+        entity.set_by_key(key, value)
+    return entity
+
+
+def build_individual_entity(pairs):
+    entity = IndividualEntity()
+    for name, value in pairs:
+        entity.set_by_name(name, value)
+    return entity
+
+
+def build_list_entity(values):
+    """
+    Builds a ContentListEntity when every value is a plain content entity, and a ListEntity otherwise.
+    """
+    values = list(values)
+    if all(type(value) is ContentEntity for value in values):
+        return ContentListEntity(value.content for value in values)
+
+    entity = ListEntity()
+    for value in values:
+        entity.append(value)
+    return entity
+
+
+def seal(entity):
+    """
+    Freezes entity and everything below it so that reading it never writes to
+    it again: lazy crosses are materialized and every shape is computed for good.
+    """
+    seen = set()
+    stack = [entity]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, CrossEntity):
+            current.materialize()
+        current.freeze()
+        if getattr(current, 'shape', None) is not None and current.shape_version != PERMANENT_VERSION:
+            current.shape = None
+        if not getattr(current, 'compact', False):
+            stack.extend(value for _, value in current)
+    entity.get_lengths()
+    return entity
+
+
+def is_frozen(entity):
+    """
+    Contents and nones never change, frozen or not.
+    """
+    return not entity.mutable or isinstance(entity, ContentEntity) or isinstance(entity, NoneEntity)
+
+
+def snapshot(entity, copies=None):
+    """
+    Returns a frozen entity that reads as entity does now. Frozen subtrees are
+    shared and mutable containers are copied once each, so later writes to
+    entity do not show through. A lazy cross is copied as a lazy cross over the
+    same operands, which are frozen already, with snapshots of the children it keeps.
+    """
+    if is_frozen(entity):
+        return entity
+    if copies is None:
+        copies = {}
+    copy = copies.get(id(entity))
+    if copy is not None:
+        return copy
+    if isinstance(entity, CrossEntity) and entity.is_lazy():
+        copy = type(entity)(entity.model, entity.mapping, entity.side, entity.left, entity.right, entity.connection, entity.choices)
+        copy.children = {key: snapshot(child, copies) for key, child in entity.children.items()}
+    elif isinstance(entity, RangeListEntity) and entity.is_virtual():
+        copy = RangeListEntity(entity.range_length)
+    elif getattr(entity, 'compact', False):
+        if isinstance(entity, ListEntity):
+            copy = ContentListEntity(entity.iterate_contents())
+        else:
+            copy = ContentGroupEntity(entity.internal_map.items())
+    elif isinstance(entity, IndividualEntity):
+        copy = build_individual_entity((name, snapshot(value, copies)) for name, value in entity)
+    elif isinstance(entity, ListEntity):
+        copy = build_list_entity(snapshot(value, copies) for _, value in entity)
+    elif isinstance(entity, GroupEntity):
+        copy = build_group_entity((key, snapshot(value, copies)) for key, value in entity)
+    else:
+        raise TypeError('Unrecognized entity type \'{:s}\'.'.format(type(entity).__name__))
+    copies[id(entity)] = copy
+    return copy.freeze()
+
+
+def thaw(entity):
+    """
+    Returns a mutable shallow copy of the container entity. The children are
+    shared, so they have to be thawed in turn before writing into them.
+    """
+    if isinstance(entity, RangeListEntity) and entity.is_virtual():
+        return RangeListEntity(entity.range_length)
+    elif isinstance(entity, IndividualEntity):
+        return build_individual_entity(entity)
+    elif isinstance(entity, ListEntity):
+        return build_list_entity(value for _, value in entity)
+    elif isinstance(entity, GroupEntity):
+        return build_group_entity(entity)
+    else:
+        raise TypeError('Unrecognized entity type \'{:s}\'.'.format(type(entity).__name__))
+
+
+def merge_lengths(lengths, child):
+    for i, x in enumerate(child):
+        if len(lengths) == i:
+            lengths.append(x)
+        else:
+            assert len(lengths) > i
+            if lengths[i] < x:
+                lengths[i] = x
+    return lengths
@@ -0,0 +1,107 @@
+import csv
+import json
+from .entity import *
+
+
+__all__ = [
+    'TextLog',
+    'RecordExporter'
+]
+
+
+FIELDS = ['event', 'line', 'statement', 'scope', 'path', 'index', 'type', 'content']
+
+
+class TextLog:
+    """
+    The human-oriented output of validate and invalidate, written to stream or to stdout.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def scope(self, scope_path):
+        print('Scope:', '.'.join(scope_path), file=self.stream)
+
+    def name(self, event, scope_path, name):
+        print('{:s}:'.format(event), name, file=self.stream)
+
+
+class RecordExporter:
+    """
+    Streams show, validate and invalidate results to stream as ndjson, csv or tsv records.
+
+    Every record has the fields of FIELDS; line and statement locate the
+    statement being executed. Records are collected in chunks of about
+    chunk_size characters that are written with a single call.
+    """
+
+    def __init__(self, stream, record_format, chunk_size=1 << 16):
+        assert record_format in ('ndjson', 'csv', 'tsv')
+        self.stream = stream
+        self.record_format = record_format
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self.chunk_length = 0
+        self.line_index = None
+        self.stmtcol_index = None
+        if record_format == 'ndjson':
+            self.encoder = json.JSONEncoder(ensure_ascii=False)
+            self.writer = None
+        else:
+            self.encoder = None
+            self.writer = csv.writer(self, delimiter=',' if record_format == 'csv' else '\t', lineterminator='\n')
+            self.writer.writerow(FIELDS)
+
+    def write(self, text):
+        self.chunk.append(text)
+        self.chunk_length += len(text)
+        if self.chunk_length >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        self.stream.writelines(self.chunk)
+        self.chunk = []
+        self.chunk_length = 0
+
+    def close(self):
+        self.flush()
+
+    def set_statement(self, node):
+        self.line_index = node.line_index
+        self.stmtcol_index = node.stmtcol_index
+
+    def record(self, event, scope, path, index, type, content):
+        if self.writer is None:
+            self.write(self.encoder.encode(dict(zip(FIELDS, (event, self.line_index, self.stmtcol_index, scope, path, index, type, content)))) + '\n')
+        else:
+            self.writer.writerow((event, self.line_index, self.stmtcol_index, scope, path, index, type, content))
+
+    def scope(self, scope_path):
+        pass
+
+    def name(self, event, scope_path, name):
+        self.record(event, '.'.join(scope_path), None, None, None, name)
+
+    def show(self, model, body, max_depth=None, max_entries=None):
+        """
+        Records the entries of Model.walk, skipping the marks of cut containers.
+        """
+        for entity, num_digits, index_prefix, indent, label, path in model.walk(body, max_depth, max_entries):
+            if entity is not None:
+                self.record('show', None, path, entity.generate_index_code(num_digits, index_prefix), get_type_name(entity), entity.content if isinstance(entity, ContentEntity) else None)
+
+
+def get_type_name(entity):
+    if isinstance(entity, NoneEntity):
+        return 'none'
+    elif isinstance(entity, ContentEntity):
+        return 'content'
+    elif isinstance(entity, IndividualEntity):
+        return 'individual'
+    elif isinstance(entity, ListEntity):
+        return 'list'
+    elif isinstance(entity, GroupEntity):
+        return 'group'
+    else:
+        raise TypeError()
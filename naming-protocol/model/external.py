@@ -0,0 +1,103 @@
+import heapq
+import sys
+import tempfile
+
+
+__all__ = [
+    'SortedRuns',
+    'group_duplicates'
+]
+
+
+ENTRY_OVERHEAD = 72
+
+
+def escape_name(name):
+    return name.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def unescape_name(text):
+    if '\\' not in text:
+        return text
+    chars = []
+    iterator = iter(text)
+    for char in iterator:
+        if char == '\\':
+            char = {'n': '\n', 't': '\t', '\\': '\\'}[next(iterator)]
+        chars.append(char)
+    return ''.join(chars)
+
+
+class SortedRuns:
+    """
+    Multiset of tagged names that keeps at most about budget bytes in memory.
+
+    Names are buffered until the estimated size of the buffer passes the
+    budget; the buffer is then sorted and spilled to a temporary file as one
+    run. merge() streams every run and the buffer in sorted order with a k-way
+    merge. Entries are (escaped name, depth, index); the escaping keeps equal
+    names equal, so duplicates end up adjacent.
+    """
+
+    def __init__(self, budget, directory=None):
+        self.budget = budget
+        self.directory = directory
+        self.buffer = []
+        self.buffer_size = 0
+        self.files = []
+
+    def add(self, name, depth, index):
+        self.buffer.append((escape_name(name), depth, index))
+        self.buffer_size += sys.getsizeof(name) + ENTRY_OVERHEAD
+        if self.buffer_size >= self.budget:
+            self.spill()
+
+    def spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort()
+        f = tempfile.TemporaryFile('w+', encoding='utf-8', newline='\n', dir=self.directory, prefix='np-run-')
+        f.writelines('{:s}\t{:d}\t{:d}\n'.format(*entry) for entry in self.buffer)
+        self.files.append(f)
+        self.buffer = []
+        self.buffer_size = 0
+
+    def read_run(self, f):
+        f.seek(0)
+        for line in f:
+            text, depth, index = line[:-1].split('\t')
+            yield text, int(depth), int(index)
+
+    def iterate_runs(self):
+        self.buffer.sort()
+        return [*(self.read_run(f) for f in self.files), iter(self.buffer)]
+
+    def merge(self):
+        return heapq.merge(*self.iterate_runs())
+
+    def __len__(self):
+        return len(self.files)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        self.files = []
+        self.buffer = []
+        self.buffer_size = 0
+
+
+def group_duplicates(entries):
+    """
+    Takes sorted (escaped name, depth, index) entries and yields (name, [(depth, index), ...]) for every repeated name.
+    """
+    current = None
+    tags = []
+    for text, depth, index in entries:
+        if text != current:
+            if len(tags) > 1:
+                yield unescape_name(current), tags
+            current = text
+            tags = []
+        tags.append((depth, index))
+    if len(tags) > 1:
+        yield unescape_name(current), tags
@@ -1,20 +1,76 @@
-import collections
+import functools
+import itertools
+import sys
+import weakref
 from .entity import *
 from .instance import *
 
 
 class Model:
-    def __init__(self):
-        pass
+    def __init__(self, immutable=False, memo_limit=1 << 16):
+        """
+        In immutable mode every entity is frozen once built, and content and
+        individual entities are hash-consed, so equal subtrees are one object.
+        Programs that write into an entity after building it, such as
+        g['k'] = 'v' or g.name = 'v' on a group or individual bound earlier,
+        are rejected there with FrozenEntityError; binding a name again, as in
+        g = g | {'k': 'v'}, is not a write and works in both modes.
+
+        memo_limit bounds the number of cross results kept by each CrossMemo.
+        """
+        self.immutable = immutable
+        self.none_entity = NoneEntity().freeze()
+        self.individual_table = weakref.WeakValueDictionary()
+        self.memo_limit = memo_limit
+        self.persistent_memos = {}
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    # Immutable-Related Methods - START
+
+    def freeze(self, entity):
+        if self.immutable:
+            entity.freeze()
+        return entity
+
+    def intern_content(self, content):
+        if not self.immutable:
+            return ContentEntity(content)
+
+        return intern_content_entity(content)
+
+    def intern_individual(self, entity):
+        """
+        Children are compared by identity, which is enough once they are interned themselves.
+        """
+        if not self.immutable:
+            return entity
+
+        key = tuple((name, id(value)) for name, value in entity)
+        interned = self.individual_table.get(key)
+        if interned is None:
+            interned = entity.freeze()
+            self.individual_table[key] = interned
+        return interned
+
+    def share(self, body, items, entity):
+        """
+        Returns the frozen body itself when the derived entity would hold exactly the same children.
+        """
+        if self.immutable and not body.mutable and len(items) == body.length() and all(value is original for (_, value), (_, original) in zip(items, body)):
+            return body
+        return self.freeze(entity)
+
+    # Immutable-Related Methods - END
 
     # Cross-Related Methods - START
 
     def cross_individual(self, left, right, connection, choices):
         if isinstance(left, NoneEntity) or isinstance(right, NoneEntity):
-            return NoneEntity()
+            return self.create_none_entity()
 
         if isinstance(left, ContentEntity) and isinstance(right, ContentEntity):
-            return ContentEntity(connection(left.content, right.content))
+            return self.intern_content(connection(left.content, right.content))
 
         if isinstance(left, ContentEntity):
             left_backup = left
@@ -33,81 +89,201 @@ class Model:
         for name, (left_choice, right_choice) in choices_dict.items():
             output.set_by_name(name, self.cross_individual(left.get_by_name(left_choice, NoneEntity()), right.get_by_name(right_choice, NoneEntity()), connection, choices))
 
-        return output
+        return self.intern_individual(output)
+
+    def create_cross(self, cls, mapping, side, left, right, connection, choices):
+        """
+        The result is lazy over frozen snapshots of the operands, so later
+        assignments into an operand do not show through.
+        """
+        return cls(self, mapping, side, snapshot(left), snapshot(right), connection, choices)
 
     def cross_right(self, mapping, left, right, connection, choices):
+        output = self.lookup_memo(mapping, 'right', left, right)
+        if output is not None:
+            return output
+
         if isinstance(right, NoneEntity):
-            output = NoneEntity()
+            output = self.create_none_entity()
         elif isinstance(right, ContentEntity) or isinstance(right, IndividualEntity):
             output = self.cross_individual(left, right, connection, choices)
         elif isinstance(right, ListEntity):
-            output = ListEntity()
-            for value in right.internal_list.items():
-                output.append(self.cross_right(mapping, left, value, connection, choices))
+            output = self.freeze(self.create_cross(CrossListEntity, mapping, 'right', left, right, connection, choices))
         elif isinstance(right, GroupEntity):
-            output = GroupEntity()
-            for key, value in right.internal_map.items():
-                output.set_by_key(key, self.cross_right(mapping, left, value, connection, choices))
+            output = self.freeze(self.create_cross(CrossGroupEntity, mapping, 'right', left, right, connection, choices))
         else:
             raise TypeError('Unrecognized entity type \'{:s}\'.'.format(type(right)))
 
-        mapping[right] = output
+        self.store_memo(mapping, 'right', left, right, output)
 
         return output
 
     def cross_left(self, mapping, left, right, connection, choices):
         if isinstance(left, NoneEntity):
-            output = NoneEntity()
+            return self.create_none_entity()
         elif isinstance(left, ContentEntity) or isinstance(left, IndividualEntity):
-            output = self.cross_right(dict(), left, right, connection, choices)
-        elif isinstance(left, ListEntity):
-            output = ListEntity()
-            for value in left.internal_list:
-                output.append(self.cross_left(mapping, value, right, connection, choices))
+            return self.cross_right(mapping, left, right, connection, choices)
+
+        output = self.lookup_memo(mapping, 'left', left, right)
+        if output is not None:
+            return output
+
+        if isinstance(left, ListEntity):
+            output = self.freeze(self.create_cross(CrossListEntity, mapping, 'left', left, right, connection, choices))
         elif isinstance(left, GroupEntity):
-            output = GroupEntity()
-            for key, value in left.internal_map.items():
-                output.set_by_key(key, self.cross_left(mapping, value, right, connection, choices))
+            output = self.freeze(self.create_cross(CrossGroupEntity, mapping, 'left', left, right, connection, choices))
         else:
             raise TypeError('Unrecognized entity type \'{:s}\'.'.format(type(left)))
 
-        mapping[left] = output
+        self.store_memo(mapping, 'left', left, right, output)
 
         return output
 
     def cross_recursive(self, mapping, left, right, connection, choices):
         return self.cross_left(mapping, left, right, connection, choices)
 
-    def cross(self, left, right, connection, choices):
-        return self.cross_recursive(dict(), left, right, connection, choices)
+    def cross(self, left, right, separator, reverse, choices):
+        if not reverse:
+            connection = functools.partial(connect, separator)
+        else:
+            connection = functools.partial(connect_reverse, separator)
+        output = self.cross_recursive(self.create_memo(left, right, separator, reverse, choices), left, right, connection, choices)
+        # Walking the shape raises whatever building the cross would, so a
+        # lazy cross of mismatched operands still fails in this statement.
+        output.get_lengths()
+        return output
+
+    @classmethod
+    def restore_cross(cls, entity_cls, immutable, side, left, right, connection, choices, children, mutable):
+        """
+        Rebuilds a lazy cross pickled by CrossEntity.__reduce__ in a model of its own.
+        """
+        model = cls(immutable)
+        entity = entity_cls(model, CrossMemo(model.memo_limit), side, left, right, connection, choices)
+        entity.children = children
+        for child in children.values():
+            child.add_parent(entity)
+        if not mutable:
+            entity.freeze()
+        return entity
+
+    def create_memo(self, left, right, separator, reverse, choices):
+        """
+        Crosses of frozen operands share one memo per separator, direction and
+        choices across statements; any other cross gets a memo of its own.
+        """
+        if self.immutable and not left.mutable and not right.mutable:
+            memo_key = (separator, reverse, tuple(tuple(choice) for choice in choices))
+            memo = self.persistent_memos.get(memo_key)
+            if memo is None:
+                memo = self.persistent_memos[memo_key] = CrossMemo(self.memo_limit)
+            return memo
+        else:
+            return CrossMemo(self.memo_limit)
+
+    def lookup_memo(self, mapping, kind, left, right):
+        output = mapping.get(kind, left, right)
+        if output is None:
+            self.memo_misses += 1
+        else:
+            self.memo_hits += 1
+        return output
+
+    def store_memo(self, mapping, kind, left, right, output):
+        """
+        Mutable outputs are not shared, so that assigning into one place of a
+        cross result never changes another.
+        """
+        if not output.mutable or isinstance(output, ContentEntity):
+            mapping.put(kind, left, right, output)
+
+    def get_memo_statistics(self):
+        return self.memo_hits, self.memo_misses
+
+    def cross_individual_lengths(self, left, right, choices):
+        """
+        Returns the lengths of cross_individual(left, right, ...) without building it.
+        """
+        if isinstance(left, NoneEntity) or isinstance(right, NoneEntity):
+            return []
+
+        if isinstance(left, ContentEntity) and isinstance(right, ContentEntity):
+            return []
+
+        choices_dict = {name: (left_choice, right_choice) for name, left_choice, right_choice in choices}
+        choices_dict.setdefault('original', ('original', 'original'))
+        lengths = []
+        for name, (left_choice, right_choice) in choices_dict.items():
+            merge_lengths(lengths, self.cross_individual_lengths(get_choice(left, left_choice), get_choice(right, right_choice), choices))
+        return [len(choices_dict), *lengths]
+
+    def cross_right_lengths(self, left, right, choices, cache=None):
+        """
+        Returns the lengths of cross_right(..., left, right, ...) without building it.
+
+        The result only depends on the individual structure of left, so every
+        content entity on the left shares the cached lengths of each right subtree.
+        """
+        if cache is None:
+            cache = {}
+        if isinstance(right, NoneEntity):
+            return []
+        elif isinstance(right, ContentEntity) or isinstance(right, IndividualEntity):
+            return self.cross_individual_lengths(left, right, choices)
+        elif isinstance(right, ListEntity) or isinstance(right, GroupEntity):
+            # The entry keeps left and right alive, so children that iterating a
+            # lazy cross creates and drops cannot pass their ids on to others.
+            cache_key = ('content' if isinstance(left, ContentEntity) else id(left), id(right))
+            if cache_key not in cache:
+                lengths = []
+                for _, value in right:
+                    merge_lengths(lengths, self.cross_right_lengths(left, value, choices, cache))
+                cache[cache_key] = left, right, [right.length(), *lengths]
+            return cache[cache_key][2]
+        else:
+            raise TypeError('Unrecognized entity type \'{:s}\'.'.format(type(right).__name__))
+
+    def cross_lengths(self, left, right, choices, cache=None):
+        """
+        Returns the lengths of cross(left, right, ...) without building it.
+        """
+        if cache is None:
+            cache = {}
+        if isinstance(left, NoneEntity):
+            return []
+        elif isinstance(left, ContentEntity) or isinstance(left, IndividualEntity):
+            return self.cross_right_lengths(left, right, choices, cache)
+        elif isinstance(left, ListEntity) or isinstance(left, GroupEntity):
+            lengths = []
+            for _, value in left:
+                merge_lengths(lengths, self.cross_lengths(value, right, choices, cache))
+            return [left.length(), *lengths]
+        else:
+            raise TypeError('Unrecognized entity type \'{:s}\'.'.format(type(left).__name__))
 
     # Cross-Related Methods - END
 
     # Public Methods
 
     def create_none_entity(self):
+        if self.immutable:
+            return self.none_entity
         return NoneEntity()
 
     def create_content_entity(self, content):
-        return ContentEntity(content)
+        return self.intern_content(content)
 
     def create_individual_entity(self, pairs):
         entity = IndividualEntity()
         for name, value in pairs:
             entity.set_by_name(name, value)
-        return entity
+        return self.intern_individual(entity)
 
     def create_list_entity(self, length):
-        list_entity = ListEntity()
-        num_digits = count_hex_length(length)
-        for i in range(length):
-            list_entity.append(ContentEntity('x{:X}'.format(i)))
+        return self.freeze(RangeListEntity(length))
 
     def create_group_entity(self, pairs):
-        entity = GroupEntity()
-        for key, value in pairs:
-            entity.set_by_key(key, value)
-        return entity
+        return self.freeze(build_group_entity(pairs))
 
     def collapse(self, center, others):
         return CollapseEntity(center, NoneEntity(), others)
@@ -123,48 +299,110 @@ class Model:
         return CollapseEntity(keep, keep, others)
 
     def group_union(self, children, keeps):
-        entity = GroupEntity()
+        internal_map = {}
         for i, child in enumerate(children):
             assert isinstance(child, GroupEntity)
             for key, value in child:
                 if key not in keeps or keeps[key] == i:
-                    entity.set_by_key(key, value)
-        return entity
+                    internal_map[key] = value
+        return self.freeze(build_group_entity(internal_map.items()))
 
     def group_filter(self, body, filter_trailer):
-        return filter_trailer.apply(None, body)
+        return self.freeze(filter_trailer.apply(None, body))
 
     def expand(self, used_set, disabled_set):
-        enabled_set = []
-        for entity in used_set:
-            if isinstance(entity, NoneEntity):
-                pass
-            elif isinstance(entity, ContentEntity) or isinstance(entity, IndividualEntity) or isinstance(entity, ListEntity) or isinstance(entity, GroupEntity):
-                enabled_set.append(entity)
-            else:
-                raise TypeError()
-
-        for entity in enabled_set:
-            if entity not in disabled_set:
-                if isinstance(entity, NoneEntity):
-                    pass
+        for batch in self.expand_batches(used_set, disabled_set):
+            yield from batch
+
+    def expand_batches(self, used_set, disabled_set, batch_size=1024):
+        """
+        Yields the contents reachable from used_set in lists of about batch_size names.
+
+        The traversal keeps an explicit stack of child iterators, so nesting
+        depth is not bounded by the recursion limit. A container reachable
+        along several paths is expanded every time, since its names collide.
+        """
+        batch = []
+        stack = [iter(used_set)]
+        while stack:
+            for entity in stack[-1]:
+                if isinstance(entity, NoneEntity) or entity in disabled_set:
+                    continue
                 elif isinstance(entity, ContentEntity):
-                    yield entity.content
-                elif isinstance(entity, IndividualEntity):
-                    yield from self.expand(entity.nvmap.values(), disabled_set)
-                elif isinstance(entity, ListEntity):
-                    yield from self.expand(entity.internal_list, disabled_set)
-                elif isinstance(entity, GroupEntity):
-                    yield from self.expand(entity.internal_map.values(), disabled_set)
+                    batch.append(entity.content)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                    continue
+                elif isinstance(entity, IndividualEntity) or isinstance(entity, ListEntity) or isinstance(entity, GroupEntity):
+                    if (isinstance(entity, ContentListEntity) or isinstance(entity, ContentGroupEntity)) and entity.compact:
+                        contents = entity.iterate_contents()
+                        batch.extend(itertools.islice(contents, batch_size - len(batch)))
+                        while len(batch) >= batch_size:
+                            yield batch
+                            batch = list(itertools.islice(contents, batch_size))
+                        continue
+                    elif isinstance(entity, IndividualEntity):
+                        stack.append(iter(entity.nvmap.values()))
+                    else:
+                        stack.append(value for _, value in entity)
+                    break
                 else:
                     raise TypeError()
-
-    def show(self, body):
-        lengths = body.get_lengths()
+            else:
+                stack.pop()
+        if batch:
+            yield batch
+
+    def show(self, body, max_depth=None, max_entries=None, output=None):
+        """
+        Writes the lines of show to output, stdout by default.
+        """
+        if output is None:
+            output = sys.stdout
+        output.writelines(self.render(body, max_depth, max_entries))
+
+    def render(self, body, max_depth=None, max_entries=None):
+        """
+        Yields the lines of show one by one.
+        """
+        for entity, num_digits, index_prefix, indent, label, path in self.walk(body, max_depth, max_entries):
+            if entity is None:
+                yield '{:s}...\n'.format(' ' * indent * 2 + '- ')
+            else:
+                yield format_represent(*entity.pure_represent(num_digits, index_prefix, indent, label))
+
+    def walk(self, body, max_depth=None, max_entries=None):
+        """
+        Yields (entity, num_digits, index_prefix, indent, label, path) for every
+        entry of show, walking the entity with an explicit stack. path joins the
+        labels from the root, which is labelled '<START>' with an empty path.
+
+        Children deeper than max_depth are not listed, and a container lists at
+        most max_entries children; the cut is marked by an entry whose entity is None.
+        The index codes are as wide as the listed part of the entity needs.
+        """
+        lengths = get_visible_lengths(body, max_depth, max_entries)
         num_digits = [count_hex_length(x) for x in lengths]
-        reprs = body.represent(num_digits, 'x', 0, '<START>')
-        for indent, prefix, ntype, info in reprs:
-            print('{}{} {} {}'.format(' ' * indent * 2 + '- ', prefix, ntype, info))
+        yield body, num_digits, 'x', 0, '<START>', ''
+        if max_depth is not None and max_depth <= 0:
+            return
+        stack = [(body, enumerate(body.iterate_labels()), num_digits, 'x', 0, '')]
+        while stack:
+            entity, children, digits, index_prefix, indent, path = stack[-1]
+            for index, (label, child) in children:
+                if max_entries is not None and index >= max_entries:
+                    yield None, None, None, indent + 1, None, path
+                    stack.pop()
+                    break
+                child_prefix = entity.generate_index_string(digits[0], index_prefix, index)
+                child_path = path + label
+                yield child, digits[1:], child_prefix, indent + 1, label, child_path
+                if max_depth is None or indent + 1 < max_depth:
+                    stack.append((child, enumerate(child.iterate_labels()), digits[1:], child_prefix, indent + 1, child_path))
+                    break
+            else:
+                stack.pop()
 
     ## Public Methods for Left Instance(s)
 
@@ -177,6 +415,29 @@ class Model:
     def create_key_left_subscript(self, key):
         return KeyLeftSubscript(key)
 
+    def thaw(self, entity):
+        """
+        Returns what a write into entity should go to. In the mutable model a
+        frozen container can only be a sealed one, such as the dependencies a
+        daemon serves or the names watch mode keeps from earlier statements, so
+        the write goes to a mutable copy instead; in the immutable model the
+        entity itself is returned and the write fails as usual.
+        """
+        if self.immutable or not (isinstance(entity, IndividualEntity) or isinstance(entity, ListEntity) or isinstance(entity, GroupEntity)) or entity.mutable:
+            return entity
+        return thaw(entity)
+
+    def thaw_child(self, entity, subscript, child):
+        """
+        Thaws child, which entity holds under subscript, and stores the copy back
+        into entity. Items of lists cannot be assigned, so they stay as they are.
+        """
+        writable = self.thaw(child)
+        if writable is not child and not isinstance(entity, ListEntity):
+            self.left_subscript(entity, subscript).set(writable)
+            return writable
+        return child
+
     def left_subscript(self, entity, subscript):
         if isinstance(entity, IndividualEntity):
             return LeftIndividualEntitySubscript(entity, subscript)
@@ -193,7 +454,7 @@ class Model:
         return IntermediateFilterTrailer(subscript, trailer)
 
     def create_filter_trailer(self, children, direction, common):
-        return FilterTrailer(children, direction, common)
+        return FilterTrailer(self, children, direction, common)
 
     def create_name_trailer_subscript(self, name):
         return NameTrailerSubscript(name)
@@ -205,8 +466,32 @@ class Model:
         return KeyTrailerSubscript(key)
 
 
+class CrossMemo:
+    """
+    Memo table of cross results keyed on the identities of both operands.
+
+    Entries keep their operands alive, so an identity cannot be reused while
+    it is cached. At most limit entries are stored.
+    """
+
+    def __init__(self, limit):
+        self.table = {}
+        self.limit = limit
+
+    def get(self, kind, left, right):
+        entry = self.table.get((kind, id(left), id(right)))
+        if entry is None:
+            return None
+        return entry[2]
+
+    def put(self, kind, left, right, output):
+        if len(self.table) < self.limit:
+            self.table[(kind, id(left), id(right))] = (left, right, output)
+
+
 class FilterTrailer:
-    def __init__(self, children, direction, common):
+    def __init__(self, model, children, direction, common):
+        self.model = model
         self.children = children
         self.direction = direction
         self.common = common
@@ -216,18 +501,15 @@ class FilterTrailer:
             common = self.common
 
         if isinstance(body, GroupEntity):
-            internal_map = collections.OrderedDict()
+            internal_map = {}
             for key, value in body:
                 internal_map[key] = (-1, value)
             for child in self.children:
                 indicator, key, value = child.apply(common, body)
                 internal_map[key] = (indicator, value)
 
-            entity = GroupEntity()
-            for key, (indicator, value) in internal_map.items():
-                if indicator * self.direction >= 0:
-                    entity.set_by_key(key, value)
-            return entity
+            items = [(key, value) for key, (indicator, value) in internal_map.items() if indicator * self.direction >= 0]
+            return self.model.share(body, items, build_group_entity(items))
         elif isinstance(body, ListEntity):
             internal_list = list()
             for index, value in body:
@@ -236,15 +518,15 @@ class FilterTrailer:
                 indicator, index, value = child.apply(common, body)
                 internal_list[index] = (indicator, value)
 
-            entity = ListEntity()
-            for indicator, value in internal_list:
+            items = []
+            for index, (indicator, value) in enumerate(internal_list):
                 if indicator * self.direction >= 0:
-                    entity.append(value)
+                    items.append((index, value))
                 else:
-                    entity.append(NoneEntity())
-            return entity
+                    items.append((index, self.model.create_none_entity()))
+            return self.model.share(body, items, build_list_entity(value for _, value in items))
         elif isinstance(body, IndividualEntity):
-            nvmap = collections.OrderedDict()
+            nvmap = {}
             for name, value in body:
                 nvmap[name] = (-1, value)
             for child in self.children:
@@ -255,7 +537,7 @@ class FilterTrailer:
             for name, (indicator, value) in nvmap.items():
                 if indicator * self.direction >= 0:
                     entity.set_by_name(name, value)
-            return entity
+            return self.model.intern_individual(entity)
         else:
             raise TypeError()
 
@@ -311,6 +593,47 @@ class KeyTrailerSubscript(TrailerSubscript):
         return 1, self.key, entity
 
 
+def get_choice(entity, choice):
+    """
+    Looks choice up the way cross_individual does, raising what it raises.
+    """
+    if isinstance(entity, ContentEntity):
+        return entity if choice == 'original' else NoneEntity()
+    return entity.get_by_name(choice, NoneEntity())
+
+
+def connect(separator, x, y):
+    return x + separator + y
+
+
+def connect_reverse(separator, x, y):
+    return y + separator + x
+
+
+def get_visible_lengths(entity, max_depth=None, max_entries=None):
+    """
+    Returns the lengths of the part of entity that show lists, without looking
+    at the children it leaves out. A shape already cached is reused when only
+    the depth is limited, since it then agrees with the listed part.
+    """
+    if max_entries is None and (max_depth is None or getattr(entity, 'shape', None) is not None and entity.is_shape_valid()):
+        lengths = entity.get_lengths()
+        return lengths if max_depth is None else lengths[:max(max_depth, 0)]
+    if max_depth is not None and max_depth <= 0:
+        return []
+    if not (isinstance(entity, IndividualEntity) or isinstance(entity, ListEntity) or isinstance(entity, GroupEntity)):
+        return entity.get_lengths()
+    children = list(itertools.islice(entity.iterate_labels(), max_entries))
+    lengths = []
+    for label, child in children:
+        merge_lengths(lengths, get_visible_lengths(child, None if max_depth is None else max_depth - 1, max_entries))
+    return [len(children), *lengths]
+
+
+def format_represent(indent, prefix, ntype, info):
+    return '{}{} {} {}\n'.format(' ' * indent * 2 + '- ', prefix, ntype, info)
+
+
 def count_hex_length(total):
     total -= 1
     count = 0
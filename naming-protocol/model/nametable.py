@@ -0,0 +1,165 @@
+import mmap
+import os
+import struct
+import tempfile
+
+
+__all__ = [
+    'NameTableBuilder',
+    'NameTable'
+]
+
+
+MAGIC = b'NPNT\x01\x00\x00\x00'
+HEADER = struct.Struct('<8sIIQQQ')
+SCOPE_RECORD = struct.Struct('<QI')
+ENTRY_RECORD = struct.Struct('<QII')
+
+
+class NameTableBuilder:
+    """
+    Collects the validated names of each scope and writes them as a name table file.
+
+    Layout, little-endian:
+        header   MAGIC, scope count, entry count, scope table offset, entry table offset, string area offset
+        scopes   (string offset, byte length) of each dotted scope path
+        entries  (string offset, byte length, scope id) of each name, sorted by
+                 the UTF-8 bytes of the name and then by scope id
+        strings  the UTF-8 bytes of the names and scope paths
+    """
+
+    def __init__(self):
+        self.scopes = {}
+
+    def add(self, scope_path, names):
+        self.scopes.setdefault('.'.join(scope_path), set()).update(names)
+
+    def write(self, path):
+        scope_paths = sorted(self.scopes)
+        strings = bytearray()
+        scope_records = []
+        for scope_path in scope_paths:
+            encoded = scope_path.encode()
+            scope_records.append((len(strings), len(encoded)))
+            strings += encoded
+
+        entries = sorted((name.encode(), scope_id) for scope_id, scope_path in enumerate(scope_paths) for name in self.scopes[scope_path])
+        entry_records = []
+        for encoded, scope_id in entries:
+            entry_records.append((len(strings), len(encoded), scope_id))
+            strings += encoded
+
+        scopes_offset = HEADER.size
+        entries_offset = scopes_offset + SCOPE_RECORD.size * len(scope_records)
+        strings_offset = entries_offset + ENTRY_RECORD.size * len(entry_records)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, len(scope_records), len(entry_records), scopes_offset, entries_offset, strings_offset))
+                f.writelines(SCOPE_RECORD.pack(*record) for record in scope_records)
+                f.writelines(ENTRY_RECORD.pack(*record) for record in entry_records)
+                f.write(strings)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class NameTable:
+    """
+    Read-only view of a name table file through mmap.
+
+    Queries binary search the fixed-size entry table in place; each probe
+    slices the bytes of one name out of the mapping and compares them directly.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < HEADER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            self.buffer.close()
+            raise ValueError('\'{:s}\' is not a name table file.'.format(path))
+        magic, self.scope_count, self.entry_count, self.scopes_offset, self.entries_offset, self.strings_offset = HEADER.unpack_from(self.buffer, 0)
+        if not (HEADER.size <= self.scopes_offset and self.scopes_offset + SCOPE_RECORD.size * self.scope_count <= self.entries_offset and self.entries_offset + ENTRY_RECORD.size * self.entry_count <= self.strings_offset <= len(self.buffer)) or self.get_strings_end() > len(self.buffer):
+            self.buffer.close()
+            raise ValueError('\'{:s}\' is a truncated or damaged name table file.'.format(path))
+
+    def get_strings_end(self):
+        """
+        Returns where the string area should end: the builder stores the names
+        after the scope paths and in entry order, so the last record has the last string.
+        """
+        if self.entry_count > 0:
+            offset, length, scope_id = ENTRY_RECORD.unpack_from(self.buffer, self.entries_offset + ENTRY_RECORD.size * (self.entry_count - 1))
+        elif self.scope_count > 0:
+            offset, length = SCOPE_RECORD.unpack_from(self.buffer, self.scopes_offset + SCOPE_RECORD.size * (self.scope_count - 1))
+        else:
+            offset, length = 0, 0
+        return self.strings_offset + offset + length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+
+    def __len__(self):
+        return self.entry_count
+
+    def get_name_bytes(self, index):
+        offset, length, scope_id = ENTRY_RECORD.unpack_from(self.buffer, self.entries_offset + ENTRY_RECORD.size * index)
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length]
+
+    def get_scope(self, scope_id):
+        offset, length = SCOPE_RECORD.unpack_from(self.buffer, self.scopes_offset + SCOPE_RECORD.size * scope_id)
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length].decode()
+
+    def get_entry(self, index):
+        offset, length, scope_id = ENTRY_RECORD.unpack_from(self.buffer, self.entries_offset + ENTRY_RECORD.size * index)
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length].decode(), self.get_scope(scope_id)
+
+    def lower_bound(self, encoded):
+        low, high = 0, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_name_bytes(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, name):
+        encoded = name.encode()
+        index = self.lower_bound(encoded)
+        return index < self.entry_count and self.get_name_bytes(index) == encoded
+
+    def get_scopes(self, name):
+        """
+        Returns the dotted paths of the scopes that validated name.
+        """
+        encoded = name.encode()
+        scopes = []
+        index = self.lower_bound(encoded)
+        while index < self.entry_count and self.get_name_bytes(index) == encoded:
+            scopes.append(self.get_entry(index)[1])
+            index += 1
+        return scopes
+
+    def iterate_prefix(self, prefix):
+        """
+        Yields (name, scope path) for every name starting with prefix, in sorted order.
+        """
+        encoded = prefix.encode()
+        index = self.lower_bound(encoded)
+        while index < self.entry_count and self.get_name_bytes(index).startswith(encoded):
+            yield self.get_entry(index)
+            index += 1
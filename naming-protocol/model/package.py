@@ -1,5 +1,11 @@
 import collections
+import heapq
+import types
 from .entity import *
+from .report import *
+from .parallel import *
+from .external import *
+from .export import *
 
 
 __all__ = [
@@ -9,12 +15,137 @@ __all__ = [
 ]
 
 
+TEXT_LOG = TextLog()
+
+
+def get_log(output):
+    """
+    Maps the output argument of validate and invalidate to a log: True prints
+    text, False prints nothing and anything else is used as the log itself.
+    """
+    if output is True:
+        return TEXT_LOG
+    elif output is False or output is None:
+        return None
+    else:
+        return output
+
+
+class SymbolTable:
+    """
+    Index of the names bound along the active holder chain.
+
+    bindings maps each name to the holders defining it, ordered by depth, so
+    name resolution looks at the innermost one instead of walking parents.
+    scope_names counts the validated names of all active scope processors,
+    which all lie on one chain, so existence checks take constant time.
+    Names bound nowhere are looked up in base, the snapshot a module builder
+    was started from.
+    """
+
+    def __init__(self, base=None):
+        self.bindings = {}
+        self.scope_names = {}
+        self.base = {} if base is None else base
+
+    def bind(self, holder, name):
+        holders = self.bindings.setdefault(name, [])
+        index = len(holders)
+        while index > 0 and holders[index - 1].depth > holder.depth:
+            index -= 1
+        holders.insert(index, holder)
+
+    def unbind(self, holder, name):
+        holders = self.bindings[name]
+        holders.remove(holder)
+        if not holders:
+            del self.bindings[name]
+
+    def lookup(self, name, depth):
+        for holder in reversed(self.bindings.get(name, [])):
+            if holder.depth <= depth:
+                return holder.resolve(name)
+        return self.base[name]
+
+    def find(self, name, depth):
+        """
+        Returns the innermost holder up to depth that binds name, or None if only base has it.
+        """
+        for holder in reversed(self.bindings.get(name, [])):
+            if holder.depth <= depth:
+                return holder
+        return None
+
+    def add_new_scope_names(self, names):
+        self.scope_names.update(dict.fromkeys(names, 1))
+
+    def add_scope_name(self, name):
+        self.scope_names[name] = self.scope_names.get(name, 0) + 1
+
+    def remove_scope_name(self, name):
+        count = self.scope_names[name] - 1
+        if count == 0:
+            del self.scope_names[name]
+        else:
+            self.scope_names[name] = count
+
+
 class Holder:
-    def __init__(self):
-        pass
+    def __init__(self, parent=None, name=None):
+        self.parent = parent
+        self.name = name
+        self.nvmap = collections.OrderedDict()
+        if parent is None:
+            self.table = SymbolTable()
+            self.depth = 0
+        else:
+            self.table = parent.table
+            self.depth = parent.depth + 1
+        if name is not None:
+            self.table.bind(self, name)
+
+    def resolve(self, name):
+        if name == self.name:
+            return self
+        else:
+            return self.nvmap[name]
 
     def get_by_name(self, name):
-        raise NotImplementedError
+        return self.table.lookup(name, self.depth)
+
+    def get_writable_by_name(self, name, thaw):
+        """
+        Returns the entity of name for a write into it: name is first bound to
+        thaw(entity) where it was bound. A name from base is bound in the module
+        builder, so base itself never changes.
+        """
+        holder = self.table.find(name, self.depth)
+        if holder is None:
+            value = self.table.base[name]
+            holder = self
+            while holder.parent is not None:
+                holder = holder.parent
+        else:
+            value = holder.resolve(name)
+        writable = thaw(value)
+        if writable is not value:
+            holder.set_by_name(name, writable)
+        return writable
+
+    def set_by_name(self, name, value):
+        if name not in self.nvmap and name != self.name:
+            self.table.bind(self, name)
+        self.nvmap[name] = value
+
+    def close(self):
+        """
+        Called when the holder is popped from the context; drops its bindings from the shared table.
+        """
+        for name in self.nvmap:
+            if name != self.name:
+                self.table.unbind(self, name)
+        if self.name is not None:
+            self.table.unbind(self, self.name)
 
     def get_by_index(self, index):
         raise NotImplementedError
@@ -24,80 +155,63 @@ class Holder:
 
 
 class ModuleBuilder(Holder):
-    def __init__(self):
-        self.nvmap = collections.OrderedDict()
+    def __init__(self, base=None):
+        super().__init__()
+        if base is not None:
+            self.table.base = base
 
     def get_scope_path(self):
         return []
 
-    def get_by_name(self, name):
-        return self.nvmap[name]
+    def snapshot(self):
+        """
+        Seals every visible entity and returns them as a read-only mapping.
 
-    def set_by_name(self, name, value):
-        self.nvmap[name] = value
+        A ModuleBuilder started from the snapshot sees these names without
+        copying them; its own assignments only shadow them.
+        """
+        values = dict(self.table.base)
+        values.update(self.nvmap)
+        for value in values.values():
+            seal(value)
+        return types.MappingProxyType(values)
 
 
 class GroupBuilder(Holder):
     def __init__(self, parent, name):
-        self.parent = parent
-        self.name = name
-        self.nvmap = collections.OrderedDict()
+        super().__init__(parent, name)
         self.kvmap = collections.OrderedDict()
 
-    def get_by_name(self, name):
-        if name == self.name:
-            return self
-        else:
-            if name in self.nvmap:
-                return self.nvmap[name]
-            else:
-                return self.parent.get_by_name(name)
-
-    def set_by_name(self, name, value):
-        self.nvmap[name] = value
-
     def get_by_key(self, key):
         return self.kvmap[key]
 
     def set_by_key(self, key, value):
         self.kvmap[key] = value
 
-    def unzip(self, entity):
+    def unzip(self, entity, source=None, filename=None):
         assert isinstance(entity, GroupEntity)
         for key, value in entity.items():
             self.set_by_key(key, value)
 
     def build(self):
-        entity = GroupEntity()
-        for key, value in self.kvmap.items():
-            entity.set_by_key(key, value)
-        return entity
+        return build_group_entity(self.kvmap.items())
 
 
 class ScopeProcessor(Holder):
     def __init__(self, parent, name):
-        self.parent = parent
-        self.name = name
-        self.nvmap = collections.OrderedDict()
+        super().__init__(parent, name)
         self.kvmap = collections.OrderedDict()
         self.used_set = []
+        self.used_sources = []
         self.names = set()
+        self.origins = {}
+        self.watermark = 0
+        self.emitted = []
+        self.runs = None
 
     def get_scope_path(self):
         return [*self.parent.get_scope_path(), self.name]
 
-    def get_by_name(self, name):
-        if name == self.name:
-            return self
-        else:
-            if name in self.nvmap:
-                return self.nvmap[name]
-            else:
-                return self.parent.get_by_name(name)
-
-    def set_by_name(self, name, value):
-        self.nvmap[name] = value
-
     def get_by_key(self, key):
         return self.kvmap[key]
 
@@ -105,40 +219,230 @@ class ScopeProcessor(Holder):
         self.kvmap[key] = value
 
     def add(self, name):
-        self.names.add(name)
+        if name not in self.names:
+            self.names.add(name)
+            self.table.add_scope_name(name)
+
+    def add_new(self, names):
+        """
+        Adds names known to be distinct and absent from every active scope.
+        """
+        self.names.update(names)
+        self.table.add_new_scope_names(names)
 
     def remove(self, name):
         self.names.remove(name)
+        self.table.remove_scope_name(name)
+
+    def close(self):
+        super().close()
+        for name in self.names:
+            self.table.remove_scope_name(name)
+        if self.runs is not None:
+            self.runs.close()
 
-    def unzip(self, entity):
+    def unzip(self, entity, source=None, filename=None):
         assert isinstance(entity, GroupEntity)
         for key, value in entity.items():
-            self.use(value)
+            self.use(value, source, filename)
 
-    def use(self, entity):
+    def use(self, entity, source=None, filename=None):
         self.used_set.append(entity)
+        self.used_sources.append((source, filename))
 
     def check_existence(self, name):
-        assert name not in self.names, 'Name \'{:s}\' already exists.'.format(name)
-        if isinstance(self.parent, ScopeProcessor):
-            self.parent.check_existence(name)
-
-    def validate(self, model, output=True):
-        if output:
-            print('Scope:', '.'.join(self.get_scope_path()))
+        assert name not in self.table.scope_names, 'Name \'{:s}\' already exists.'.format(name)
+
+    def find_origin(self, name):
+        holder = self
+        while isinstance(holder, ScopeProcessor):
+            if name in holder.names:
+                return holder.origins.get(name, Occurrence(holder.get_scope_path()))
+            holder = holder.parent
+        raise KeyError(name)
+
+    def validate(self, model, output=True, report=None, executor=None, jobs=1, budget=None):
+        """
+        Only expands the entities used since the last validate; the names each
+        of them emitted are kept for invalidate.
+
+        With a report, a name that already exists is recorded there and
+        skipped instead of raising. With an executor, the used entities are
+        expanded by jobs worker processes, see find_sharded_collisions; the
+        effects are the same as the serial path.
+        With a memory budget in bytes, names are kept in sorted runs on disk
+        instead, see validate_external.
+        """
+        if budget is not None:
+            return self.validate_external(model, output, report, budget)
+        if executor is not None and jobs > 1:
+            return self.validate_sharded(model, output, report, executor, jobs)
+        log = get_log(output)
+        scope_path = self.get_scope_path()
+        if log is not None:
+            log.scope(scope_path)
         disabled_set = set()
-        for name in model.expand(self.used_set, disabled_set):
-            if output:
-                print('validate:', name)
-            self.check_existence(name)
-            self.names.add(name)
+        while self.watermark < len(self.used_set):
+            emitted = []
+            if report is not None:
+                occurrence = Occurrence(scope_path, *self.used_sources[self.watermark])
+            for batch in model.expand_batches([self.used_set[self.watermark]], disabled_set):
+                for name in batch:
+                    if log is not None:
+                        log.name('validate', scope_path, name)
+                    if report is None:
+                        self.check_existence(name)
+                    elif name in self.table.scope_names:
+                        report.add(name, self.find_origin(name), occurrence)
+                        continue
+                    else:
+                        self.origins[name] = occurrence
+                    self.add(name)
+                    emitted.append(name)
+            self.emitted.append(emitted)
+            self.watermark += 1
+
+    def validate_sharded(self, model, output, report, executor, jobs, min_names=1 << 12):
+        log = get_log(output)
+        scope_path = self.get_scope_path()
+        if log is not None:
+            log.scope(scope_path)
+        names, bounds, collisions = find_sharded_collisions(executor, jobs, self.used_set[self.watermark:], self.table.scope_names.keys(), min_names)
+
+        # Replay the serial validate: names between two collisions are added in bulk.
+        collisions.append(len(names))
+        position = 0
+        next_collision = 0
+        for end in bounds:
+            emitted = []
+            if report is not None:
+                occurrence = Occurrence(scope_path, *self.used_sources[self.watermark])
+            while position < end:
+                stop = min(end, collisions[next_collision])
+                if position < stop:
+                    segment = names[position:stop]
+                    if log is not None:
+                        for name in segment:
+                            log.name('validate', scope_path, name)
+                    if report is not None:
+                        self.origins.update(dict.fromkeys(segment, occurrence))
+                    self.add_new(segment)
+                    emitted.extend(segment)
+                    position = stop
+                if position < end:
+                    name = names[position]
+                    if log is not None:
+                        log.name('validate', scope_path, name)
+                    if report is None:
+                        self.check_existence(name)
+                    report.add(name, self.find_origin(name), occurrence)
+                    next_collision += 1
+                    position += 1
+            self.emitted.append(emitted)
+            self.watermark += 1
+
+    def find_holder(self, depth):
+        holder = self
+        while holder.depth > depth:
+            holder = holder.parent
+        return holder
+
+    def find_external_origin(self, name, depth, index):
+        if depth < 0:
+            return self.find_origin(name)
+        holder = self.find_holder(depth)
+        return Occurrence(holder.get_scope_path(), *holder.used_sources[index])
+
+    def validate_external(self, model, output, report, budget):
+        """
+        Memory-bounded validate: the names of this scope go to sorted runs that
+        spill to temporary files past budget bytes, and collisions are found by
+        one k-way merge of these runs with the runs of the enclosing scopes and
+        the names held in memory.
+
+        Collisions are only known after the merge, so without a report the
+        error names the smallest colliding name rather than the first one
+        produced. The runs stay on disk until invalidate or the end of the scope.
+        """
+        log = get_log(output)
+        scope_path = self.get_scope_path()
+        if log is not None:
+            log.scope(scope_path)
+        if self.runs is None:
+            self.runs = SortedRuns(budget)
+        first_index = self.watermark
+        disabled_set = set()
+        while self.watermark < len(self.used_set):
+            for batch in model.expand_batches([self.used_set[self.watermark]], disabled_set):
+                for name in batch:
+                    if log is not None:
+                        log.name('validate', scope_path, name)
+                    self.runs.add(name, self.depth, self.watermark)
+            self.watermark += 1
+
+        inputs = [sorted((escape_name(name), -1, 0) for name in self.table.scope_names)]
+        holder = self
+        while isinstance(holder, ScopeProcessor):
+            if holder.runs is not None:
+                inputs.extend(holder.runs.iterate_runs())
+            holder = holder.parent
+
+        # One Occurrence per use statement, so that the report counts repeated emissions.
+        occurrences = {}
+        for name, tags in group_duplicates(heapq.merge(*inputs)):
+            if not any(depth == self.depth and index >= first_index for depth, index in tags):
+                continue
+            assert report is not None, 'Name \'{:s}\' already exists.'.format(name)
+            if tags[0][0] < 0:
+                origin = self.find_origin(name)
+            else:
+                origin = occurrences.get(tags[0])
+                if origin is None:
+                    origin = occurrences[tags[0]] = self.find_external_origin(name, *tags[0])
+            for tag in tags[1:]:
+                if tag[0] == self.depth and tag[1] >= first_index:
+                    occurrence = occurrences.get(tag)
+                    if occurrence is None:
+                        occurrence = occurrences[tag] = self.find_external_origin(name, *tag)
+                    report.add(name, origin, occurrence)
 
     def invalidate(self, model, output=True):
-        if output:
-            print('Scope:', '.'.join(self.get_scope_path()))
+        if self.runs is not None:
+            return self.invalidate_external(model, output)
+        log = get_log(output)
+        scope_path = self.get_scope_path()
+        if log is not None:
+            log.scope(scope_path)
         disabled_set = set()
-        for name in model.expand(self.used_set, disabled_set):
-            if output:
-                print('invalidate:', name)
-            assert name in self.names, 'Name \'{:s}\' does not exist.'.format(name)
-            self.names.remove(name)
+        for emitted in self.emitted:
+            for name in emitted:
+                if log is not None:
+                    log.name('invalidate', scope_path, name)
+                assert name in self.names, 'Name \'{:s}\' does not exist.'.format(name)
+                self.remove(name)
+                self.origins.pop(name, None)
+        for batch in model.expand_batches(self.used_set[self.watermark:], disabled_set):
+            for name in batch:
+                if log is not None:
+                    log.name('invalidate', scope_path, name)
+                assert name in self.names, 'Name \'{:s}\' does not exist.'.format(name)
+                self.remove(name)
+                self.origins.pop(name, None)
+        self.emitted = []
+        self.watermark = 0
+
+    def invalidate_external(self, model, output):
+        """
+        Drops the runs of this scope. Names are listed by expanding the used entities
+        again, so skipped duplicates are listed too.
+        """
+        log = get_log(output)
+        scope_path = self.get_scope_path()
+        if log is not None:
+            log.scope(scope_path)
+            for batch in model.expand_batches(self.used_set[:self.watermark], set()):
+                for name in batch:
+                    log.name('invalidate', scope_path, name)
+        self.runs.close()
+        self.runs = None
+        self.watermark = 0
@@ -0,0 +1,147 @@
+import pickle
+from .entity import *
+from .model import Model
+
+
+__all__ = [
+    'find_collisions',
+    'find_sharded_collisions'
+]
+
+
+# Units per job that split_entities aims for, and chunks of units per job handed to the pool.
+UNITS_PER_JOB = 16
+CHUNKS_PER_JOB = 4
+
+
+def find_collisions(existing, indices, names):
+    """
+    Returns the indices of the names that are already in existing or repeat an earlier name.
+    """
+    seen = set()
+    collisions = []
+    for index, name in zip(indices, names):
+        if name in existing or name in seen:
+            collisions.append(index)
+        else:
+            seen.add(name)
+    return collisions
+
+
+def get_expansion_children(entity):
+    """
+    Returns the children whose expansions, in order, make up the expansion of
+    entity, or None if entity is expanded as a whole.
+    """
+    if isinstance(entity, IndividualEntity):
+        return list(entity.nvmap.values())
+    elif (isinstance(entity, ListEntity) or isinstance(entity, GroupEntity)) and not getattr(entity, 'compact', False):
+        return [value for _, value in entity]
+    else:
+        return None
+
+
+def split_entities(entities, count):
+    """
+    Replaces containers by their children, one level at a time, until there
+    are at least count units or nothing is left to split. Returns the units
+    and, for each unit, the position of the entity it comes from; expanding
+    the units in order gives the expansion of entities.
+    """
+    units = list(entities)
+    owners = list(range(len(units)))
+    while len(units) < count:
+        split_units = []
+        split_owners = []
+        for unit, owner in zip(units, owners):
+            children = get_expansion_children(unit)
+            if children:
+                split_units.extend(children)
+                split_owners.extend([owner] * len(children))
+            else:
+                split_units.append(unit)
+                split_owners.append(owner)
+        if len(split_units) == len(units):
+            break
+        units = split_units
+        owners = split_owners
+    return units, owners
+
+
+def expand_units(units, min_names=None):
+    """
+    Returns the names of the units and the number of names after each unit.
+    With min_names, stops after the first unit that reaches it.
+    """
+    model = Model()
+    names = []
+    ends = []
+    for unit in units:
+        for batch in model.expand_batches([unit], set()):
+            names.extend(batch)
+        ends.append(len(names))
+        if min_names is not None and len(names) >= min_names:
+            break
+    return names, ends
+
+
+def index_names(names):
+    """
+    Returns the position of the first occurrence of every name and the positions of the repeats.
+    """
+    first = {}
+    repeats = []
+    for index, name in enumerate(names):
+        if name in first:
+            repeats.append(index)
+        else:
+            first[name] = index
+    return first, repeats
+
+
+def expand_chunk(data):
+    names, ends = expand_units(pickle.loads(data))
+    return (names, ends, *index_names(names))
+
+
+def find_sharded_collisions(executor, jobs, entities, existing, min_names=1 << 12):
+    """
+    Expands the entities and returns (names, bounds, collisions): bounds[i] is
+    the number of names up to entity i, and collisions are the same as
+    find_collisions(existing, range(len(names)), names).
+
+    The entities are split into units, and this process expands units until
+    it has min_names names; if any are left, they go to the executor in
+    contiguous chunks, each pickled once, and are expanded there. Lazy crosses
+    pickle as their operands, so the workers build them. Each chunk reports
+    its own repeats and the first position of each of its names, and the
+    chunks are merged in order here with set operations on these names.
+    """
+    units, owners = split_entities(entities, jobs * UNITS_PER_JOB)
+    names, ends = expand_units(units, min_names)
+    results = [(names, ends, *index_names(names))]
+    rest = units[len(ends):]
+    if rest:
+        size = -(-len(rest) // (jobs * CHUNKS_PER_JOB))
+        chunks = [pickle.dumps(rest[start:start + size], pickle.HIGHEST_PROTOCOL) for start in range(0, len(rest), size)]
+        results.extend(executor.map(expand_chunk, chunks))
+
+    names = []
+    unit_ends = []
+    collisions = []
+    seen = set()
+    for chunk_names, chunk_ends, first, repeats in results:
+        offset = len(names)
+        collisions.extend(offset + index for index in repeats)
+        taken = first.keys() & existing
+        taken |= first.keys() & seen
+        collisions.extend(offset + first[name] for name in taken)
+        seen.update(first)
+        names.extend(chunk_names)
+        unit_ends.extend(offset + end for end in chunk_ends)
+    collisions.sort()
+
+    bounds = [0] * len(entities)
+    for owner, end in zip(owners, unit_ends):
+        bounds[owner] = end
+    return names, bounds, collisions
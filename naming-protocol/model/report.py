@@ -0,0 +1,82 @@
+__all__ = [
+    'Occurrence',
+    'CollisionReport'
+]
+
+
+class Occurrence:
+    """
+    Where a validated name came from: the scope validating it and the use
+    statement that introduced it, with the file that statement is in.
+    """
+
+    __slots__ = ('scope_path', 'filename', 'line_index', 'stmtcol_index', 'content')
+
+    def __init__(self, scope_path, source=None, filename=None):
+        self.scope_path = scope_path
+        self.filename = filename
+        if source is None:
+            self.line_index = None
+            self.stmtcol_index = None
+            self.content = None
+        else:
+            self.line_index = source.line_index
+            self.stmtcol_index = source.stmtcol_index
+            self.content = source.content
+
+    def get_key(self):
+        return tuple(self.scope_path), self.filename, self.line_index, self.stmtcol_index
+
+    def __str__(self):
+        scope = '.'.join(self.scope_path)
+        if self.content is None:
+            return 'Scope {:s}, unknown statement.'.format(scope)
+        if self.filename is None:
+            return 'Scope {:s}, line {:d} statement {:d}: {:s}'.format(scope, self.line_index, self.stmtcol_index, self.content)
+        return 'Scope {:s}, file \'{:s}\' line {:d} statement {:d}: {:s}'.format(scope, self.filename, self.line_index, self.stmtcol_index, self.content)
+
+
+class CollisionReport:
+    """
+    Collects every name collision found by validate instead of stopping at the first one.
+
+    Collisions are grouped by name; each group starts with the occurrence that
+    defined the name first, followed by every statement that repeated it, with
+    the number of times each statement emitted the name. Every validate creates
+    its own Occurrence objects, so a statement validated again after invalidate
+    counts the emissions of its latest run instead of adding them up.
+    """
+
+    def __init__(self):
+        self.collisions = {}
+
+    def add(self, name, first, occurrence):
+        entries = self.collisions.setdefault(name, {})
+        self.count(entries, first, 0)
+        self.count(entries, occurrence, 1)
+
+    def count(self, entries, occurrence, step):
+        entry = entries.get(occurrence.get_key())
+        if entry is None or entry[0] is not occurrence:
+            entries[occurrence.get_key()] = [occurrence, 1]
+        else:
+            entry[1] += step
+
+    def get_collisions(self):
+        """
+        Returns (name, [(occurrence, count), ...]) for every colliding name.
+        """
+        return [(name, [tuple(entry) for entry in entries.values()]) for name, entries in self.collisions.items()]
+
+    def __len__(self):
+        return len(self.collisions)
+
+    def lines(self):
+        yield 'Collision report: {:d} conflicting names.'.format(len(self.collisions))
+        for name, entries in self.get_collisions():
+            yield 'Name \'{:s}\' defined {:d} times:'.format(name, sum(count for _, count in entries))
+            for occurrence, count in entries:
+                if count == 1:
+                    yield '  ' + str(occurrence)
+                else:
+                    yield '  {:s} ({:d} times)'.format(str(occurrence), count)
@@ -0,0 +1,47 @@
+import threading
+from .model import Model
+from .context import Context
+from .package import ModuleBuilder
+
+
+__all__ = [
+    'ModuleSnapshot'
+]
+
+
+class ModuleSnapshot:
+    """
+    Read-only view of a finished module that many threads can query at once without locks.
+
+    The names are sealed when the snapshot is taken, so reading them never
+    writes to shared state. What a query writes stays in its thread: the
+    context stack, the module builder shadowing the sealed names, and an
+    immutable Model with its own individual and memo tables. Only content
+    entities are interned for the whole process, see intern_content_entity;
+    they are frozen and never change, so sharing them is safe.
+    """
+
+    def __init__(self, module_builder):
+        self.names = module_builder.snapshot()
+        self.local = threading.local()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def get_by_name(self, name):
+        return self.names[name]
+
+    def get_model(self):
+        """
+        Returns the model of the calling thread.
+        """
+        model = getattr(self.local, 'model', None)
+        if model is None:
+            model = self.local.model = Model(True)
+        return model
+
+    def create_context(self):
+        """
+        Returns a fresh context over the snapshot for the calling thread.
+        """
+        return Context(ModuleBuilder(self.names))
@@ -0,0 +1,486 @@
+import collections.abc
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import types
+from multiprocessing import shared_memory
+from .entity import *
+
+
+__all__ = [
+    'EntityStoreBuilder',
+    'EntityStore'
+]
+
+
+# Stores opened in this process to unpickle views, by locator.
+STORES = {}
+
+ATTACH_LOCK = threading.Lock()
+
+
+MAGIC = b'NPES\x01\x00\x00\x00'
+HEADER = struct.Struct('<8sIIQQQQ')
+NODE = struct.Struct('<BBxxIQQ')
+EDGE = struct.Struct('<I')
+KEYED_EDGE = struct.Struct('<QII')
+NAME_RECORD = struct.Struct('<QII')
+DEPTH = struct.Struct('<I')
+LENGTH = struct.Struct('<Q')
+
+NONE_NODE = 0
+CONTENT_NODE = 1
+INDIVIDUAL_NODE = 2
+LIST_NODE = 3
+GROUP_NODE = 4
+
+COMPACT_FLAG = 1
+
+
+class EntityStoreBuilder:
+    """
+    Serializes named entity graphs into one flat buffer of fixed-size records.
+
+    Layout, little-endian:
+        header   MAGIC, node count, name count, node table offset, edge area
+                 offset, name table offset, string area offset
+        nodes    (kind, flags, count, a, b) of each entity. A content node
+                 keeps its string in (a, count). A list node keeps count child
+                 ids at edge offset a. Individual and group nodes keep count
+                 (string offset, byte length, child id) edges at a in their
+                 own order, then the positions of those edges sorted by key.
+                 b is the edge offset of the per-depth lengths of a container.
+        edges    the child lists and lengths of the containers
+        names    (string offset, byte length, node id) of each module name,
+                 sorted by the UTF-8 bytes of the name
+        strings  the UTF-8 bytes of contents, keys and names
+
+    Entities reachable along several paths are stored once, and so is every
+    distinct content. The entities are sealed before they are stored.
+    """
+
+    def __init__(self):
+        self.names = {}
+
+    def add(self, name, entity):
+        self.names[name] = seal(entity)
+
+    def add_names(self, names):
+        for name, entity in names.items():
+            self.add(name, entity)
+
+    def build(self):
+        strings = bytearray()
+        string_offsets = {}
+
+        def add_string(text):
+            offset = string_offsets.get(text)
+            encoded = text.encode()
+            if offset is None:
+                offset = string_offsets[text] = len(strings)
+                strings.extend(encoded)
+            return offset, len(encoded)
+
+        entities = []
+        node_ids = {}
+        content_ids = {}
+
+        def get_node_id(entity):
+            if isinstance(entity, ContentEntity):
+                node_id = content_ids.get(entity.content)
+                if node_id is None:
+                    node_id = content_ids[entity.content] = len(entities)
+                    entities.append(entity)
+                return node_id
+            node_id = node_ids.get(id(entity))
+            if node_id is None:
+                node_id = node_ids[id(entity)] = len(entities)
+                entities.append(entity)
+            return node_id
+
+        name_records = []
+        for name, entity in self.names.items():
+            offset, length = add_string(name)
+            name_records.append((name.encode(), offset, length, get_node_id(entity)))
+        name_records.sort()
+
+        nodes = []
+        edges = bytearray()
+        index = 0
+        while index < len(entities):
+            entity = entities[index]
+            index += 1
+            if isinstance(entity, NoneEntity):
+                nodes.append((NONE_NODE, 0, 0, 0, 0))
+            elif isinstance(entity, ContentEntity):
+                offset, length = add_string(entity.content)
+                nodes.append((CONTENT_NODE, 0, length, offset, 0))
+            else:
+                children = list(entity)
+                flags = COMPACT_FLAG if children and all(type(value) is ContentEntity for _, value in children) else 0
+                edges_offset = len(edges)
+                if isinstance(entity, ListEntity):
+                    kind = LIST_NODE
+                    for _, value in children:
+                        edges += EDGE.pack(get_node_id(value))
+                elif isinstance(entity, IndividualEntity) or isinstance(entity, GroupEntity):
+                    kind = INDIVIDUAL_NODE if isinstance(entity, IndividualEntity) else GROUP_NODE
+                    for key, value in children:
+                        edges += KEYED_EDGE.pack(*add_string(key), get_node_id(value))
+                    for position in sorted(range(len(children)), key=lambda position: children[position][0].encode()):
+                        edges += EDGE.pack(position)
+                else:
+                    raise TypeError()
+                lengths_offset = len(edges)
+                lengths = entity.get_lengths()
+                edges += DEPTH.pack(len(lengths))
+                edges += b''.join(LENGTH.pack(length) for length in lengths)
+                nodes.append((kind, flags, len(children), edges_offset, lengths_offset))
+
+        nodes_offset = HEADER.size
+        edges_offset = nodes_offset + NODE.size * len(nodes)
+        names_offset = edges_offset + len(edges)
+        strings_offset = names_offset + NAME_RECORD.size * len(name_records)
+
+        data = bytearray(HEADER.pack(MAGIC, len(nodes), len(name_records), nodes_offset, edges_offset, names_offset, strings_offset))
+        data += b''.join(NODE.pack(*node) for node in nodes)
+        data += edges
+        data += b''.join(NAME_RECORD.pack(offset, length, node_id) for encoded, offset, length, node_id in name_records)
+        data += strings
+        return data
+
+    def write(self, path):
+        data = self.build()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def write_shared_memory(self, name=None):
+        """
+        Copies the buffer into a new shared memory block and returns it; the caller unlinks it when done.
+        """
+        data = self.build()
+        block = shared_memory.SharedMemory(name, create=True, size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        return block
+
+
+class EntityStore(collections.abc.Mapping):
+    """
+    Read-only mapping from module names to views of a stored entity graph.
+
+    The views are entities whose children are decoded from the buffer on
+    access, so attaching to a store costs nothing up front and every process
+    reading the same file or shared memory block shares its pages. Each node
+    gets one view per store, so entity identity holds as in the original graph.
+    A store can start a ModuleBuilder as its base.
+
+    A store opened from a file or shared memory block has a locator, and its
+    views pickle as that locator and their node id, so worker processes read
+    them from the same pages instead of receiving a copy.
+    """
+
+    def __init__(self, buffer, owner=None, locator=None):
+        self.buffer = buffer
+        self.owner = owner
+        self.locator = locator
+        magic, self.node_count, self.name_count, self.nodes_offset, self.edges_offset, self.names_offset, self.strings_offset = HEADER.unpack_from(buffer, 0)
+        assert magic == MAGIC, 'Not an entity store.'
+        self.views = {}
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, buffer, ('path', os.path.abspath(path)))
+
+    @classmethod
+    def attach(cls, name):
+        block = attach_shared_memory(name)
+        return cls(block.buf.toreadonly(), block, ('shared_memory', name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.views = {}
+        if isinstance(self.buffer, memoryview):
+            self.buffer.release()
+        if self.owner is not None:
+            self.owner.close()
+
+    def get_string(self, offset, length):
+        start = self.strings_offset + offset
+        return str(self.buffer[start:start + length], 'utf-8')
+
+    def get_string_bytes(self, offset, length):
+        start = self.strings_offset + offset
+        return bytes(self.buffer[start:start + length])
+
+    def get_view(self, node_id):
+        view = self.views.get(node_id)
+        if view is None:
+            view = self.views[node_id] = self.create_view(node_id)
+        return view
+
+    def create_view(self, node_id):
+        kind, flags, count, a, b = NODE.unpack_from(self.buffer, self.nodes_offset + NODE.size * node_id)
+        if kind == NONE_NODE:
+            return NoneEntity().freeze()
+        elif kind == CONTENT_NODE:
+            return intern_content_entity(self.get_string(a, count))
+        elif kind == INDIVIDUAL_NODE:
+            return StoredIndividualEntity(self, node_id, count, a, b)
+        elif kind == LIST_NODE:
+            return StoredListEntity(self, node_id, count, a, b, flags & COMPACT_FLAG != 0)
+        elif kind == GROUP_NODE:
+            return StoredGroupEntity(self, node_id, count, a, b, flags & COMPACT_FLAG != 0)
+        else:
+            raise TypeError()
+
+    def get_content(self, node_id):
+        kind, flags, count, a, b = NODE.unpack_from(self.buffer, self.nodes_offset + NODE.size * node_id)
+        assert kind == CONTENT_NODE
+        return self.get_string(a, count)
+
+    def get_child_id(self, edges, index):
+        return EDGE.unpack_from(self.buffer, self.edges_offset + edges + EDGE.size * index)[0]
+
+    def get_keyed_edge(self, edges, index):
+        return KEYED_EDGE.unpack_from(self.buffer, self.edges_offset + edges + KEYED_EDGE.size * index)
+
+    def iterate_keyed_edges(self, edges, count):
+        for index in range(count):
+            offset, length, node_id = self.get_keyed_edge(edges, index)
+            yield self.get_string(offset, length), node_id
+
+    def find_keyed_edge(self, edges, count, key):
+        """
+        Binary searches the sorted positions of the edges and returns the child id of key, or None.
+        """
+        encoded = key.encode()
+        positions = edges + KEYED_EDGE.size * count
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, node_id = self.get_keyed_edge(edges, self.get_child_id(positions, middle))
+            if self.get_string_bytes(offset, length) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count:
+            offset, length, node_id = self.get_keyed_edge(edges, self.get_child_id(positions, low))
+            if self.get_string_bytes(offset, length) == encoded:
+                return node_id
+        return None
+
+    def get_lengths(self, lengths_offset):
+        start = self.edges_offset + lengths_offset
+        depth, = DEPTH.unpack_from(self.buffer, start)
+        return [LENGTH.unpack_from(self.buffer, start + DEPTH.size + LENGTH.size * index)[0] for index in range(depth)]
+
+    def get_name_record(self, index):
+        return NAME_RECORD.unpack_from(self.buffer, self.names_offset + NAME_RECORD.size * index)
+
+    def __getitem__(self, name):
+        encoded = name.encode()
+        low, high = 0, self.name_count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, node_id = self.get_name_record(middle)
+            if self.get_string_bytes(offset, length) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.name_count:
+            offset, length, node_id = self.get_name_record(low)
+            if self.get_string_bytes(offset, length) == encoded:
+                return self.get_view(node_id)
+        raise KeyError(name)
+
+    def __iter__(self):
+        for index in range(self.name_count):
+            offset, length, node_id = self.get_name_record(index)
+            yield self.get_string(offset, length)
+
+    def __len__(self):
+        return self.name_count
+
+    def get_by_name(self, name):
+        return self[name]
+
+
+class StoredIndividualEntity(IndividualEntity):
+    __slots__ = ('store', 'node_id', 'count', 'edges', 'lengths_offset')
+
+    def __init__(self, store, node_id, count, edges, lengths_offset):
+        self.mutable = False
+        self.shape = None
+        self.shape_version = 0
+        self.version = 0
+        self.parents = None
+        self.store = store
+        self.node_id = node_id
+        self.count = count
+        self.edges = edges
+        self.lengths_offset = lengths_offset
+
+    @property
+    def nvmap(self):
+        return dict(self)
+
+    def __reduce__(self):
+        if self.store.locator is not None:
+            return get_stored_view, (self.store.locator, self.node_id)
+        return build_individual_entity, (list(self),)
+
+    def freeze(self):
+        return self
+
+    def get_by_name(self, name, default=None):
+        node_id = self.store.find_keyed_edge(self.edges, self.count, name)
+        if node_id is not None:
+            return self.store.get_view(node_id)
+        elif default is None:
+            raise KeyError(name)
+        else:
+            return default
+
+    def __iter__(self):
+        for name, node_id in self.store.iterate_keyed_edges(self.edges, self.count):
+            yield name, self.store.get_view(node_id)
+
+    def compute_lengths(self):
+        return self.store.get_lengths(self.lengths_offset)
+
+
+class StoredListEntity(ContentListEntity):
+    __slots__ = ('store', 'node_id', 'count', 'edges', 'lengths_offset')
+
+    def __init__(self, store, node_id, count, edges, lengths_offset, compact):
+        self.mutable = False
+        self.shape = None
+        self.shape_version = 0
+        self.version = 0
+        self.parents = None
+        self.compact = compact
+        self.store = store
+        self.node_id = node_id
+        self.count = count
+        self.edges = edges
+        self.lengths_offset = lengths_offset
+
+    def __reduce__(self):
+        if self.store.locator is not None:
+            return get_stored_view, (self.store.locator, self.node_id)
+        return build_list_entity, ([value for _, value in self],)
+
+    def freeze(self):
+        return self
+
+    def length(self):
+        return self.count
+
+    def get_by_index(self, index):
+        assert 0 <= index and index < self.count
+        return self.store.get_view(self.store.get_child_id(self.edges, index))
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield index, self.store.get_view(self.store.get_child_id(self.edges, index))
+
+    def iterate_contents(self):
+        assert self.compact
+        return (self.store.get_content(self.store.get_child_id(self.edges, index)) for index in range(self.count))
+
+    def compute_lengths(self):
+        return self.store.get_lengths(self.lengths_offset)
+
+
+class StoredGroupEntity(ContentGroupEntity):
+    __slots__ = ('store', 'node_id', 'count', 'edges', 'lengths_offset')
+
+    def __init__(self, store, node_id, count, edges, lengths_offset, compact):
+        self.mutable = False
+        self.shape = None
+        self.shape_version = 0
+        self.version = 0
+        self.parents = None
+        self.compact = compact
+        self.store = store
+        self.node_id = node_id
+        self.count = count
+        self.edges = edges
+        self.lengths_offset = lengths_offset
+
+    def __reduce__(self):
+        if self.store.locator is not None:
+            return get_stored_view, (self.store.locator, self.node_id)
+        return build_group_entity, (list(self),)
+
+    def freeze(self):
+        return self
+
+    def length(self):
+        return self.count
+
+    def get_by_key(self, key):
+        node_id = self.store.find_keyed_edge(self.edges, self.count, key)
+        if node_id is None:
+            raise KeyError(key)
+        return self.store.get_view(node_id)
+
+    def __iter__(self):
+        for key, node_id in self.store.iterate_keyed_edges(self.edges, self.count):
+            yield key, self.store.get_view(node_id)
+
+    def iterate_contents(self):
+        assert self.compact
+        return (self.store.get_content(node_id) for key, node_id in self.store.iterate_keyed_edges(self.edges, self.count))
+
+    def compute_lengths(self):
+        return self.store.get_lengths(self.lengths_offset)
+
+
+def attach_shared_memory(name):
+    """
+    Opens the shared memory block without registering it with the resource
+    tracker, which would unlink it once the processes sharing the tracker
+    exit; only its creator owns it. This is track=False from Python 3.13 on.
+    Before, unregistering after the fact would also drop the registration of
+    a creator sharing the tracker, as pool workers do, so registering is
+    skipped instead.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    with ATTACH_LOCK:
+        tracker = shared_memory.resource_tracker
+        shared_memory.resource_tracker = types.SimpleNamespace(register=lambda name, rtype: None, unregister=tracker.unregister)
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            shared_memory.resource_tracker = tracker
+
+
+def get_stored_view(locator, node_id):
+    store = STORES.get(locator)
+    if store is None:
+        kind, target = locator
+        if kind == 'path':
+            store = STORES[locator] = EntityStore.open(target)
+        else:
+            store = STORES[locator] = EntityStore.attach(target)
+    return store.get_view(node_id)
@@ -1,8 +1,11 @@
 from antlr4 import *
+from antlr4.error.Errors import ParseCancellationException
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
 from ..grammar import NamingProtocolLexer, NamingProtocolParser
 
 
 __all__ = [
+    'Parser',
     'StdinParser',
     'StringParser',
     'FileParser'
@@ -10,30 +13,70 @@ __all__ = [
 
 
 class Parser(NamingProtocolParser):
-    def __init__(self, input_stream):
+    """
+    Parses in two stages: SLL prediction with a bail-out error strategy first,
+    then full LL prediction only when the SLL stage fails.
+
+    The resulting tree is the same either way, the fallback only costs time;
+    the class-level counters record how often it fires.
+    """
+
+    sll_successes = 0
+    ll_fallbacks = 0
+
+    def __init__(self, input_stream, force_ll=False):
         lexer = NamingProtocolLexer(input_stream)
         stream = CommonTokenStream(lexer)
         super().__init__(stream)
         self.input_stream = input_stream
+        self.force_ll = force_ll
 
     def parse(self):
-        raise NotImplementedError
+        return self.parse_rule(self.fileInput)
+
+    def parse_rule(self, rule):
+        if self.force_ll:
+            return rule()
+
+        start = self._input.index
+        listeners = self._listeners
+        self._interp.predictionMode = PredictionMode.SLL
+        self._errHandler = BailErrorStrategy()
+        self.removeErrorListeners()
+        try:
+            tree = rule()
+        except ParseCancellationException:
+            tree = None
+        finally:
+            self._listeners = listeners
+            self._errHandler = DefaultErrorStrategy()
+            self._interp.predictionMode = PredictionMode.LL
+
+        if tree is not None:
+            Parser.sll_successes += 1
+            return tree
+
+        Parser.ll_fallbacks += 1
+        self.reset()
+        self._input.seek(start)
+        return rule()
+
+    @classmethod
+    def get_statistics(cls):
+        return cls.sll_successes, cls.ll_fallbacks
 
 
 class StdinParser(Parser):
-    def __init__(self):
-        super().__init__(StdinStream())
+    def __init__(self, force_ll=False):
+        super().__init__(StdinStream(), force_ll)
 
 
 class StringParser(Parser):
-    def __init__(self, content):
-        super().__init__(InputStream(content))
+    def __init__(self, content, force_ll=False):
+        super().__init__(InputStream(content), force_ll)
 
 
 class FileParser(Parser):
-    def __init__(self, fpath):
+    def __init__(self, fpath, force_ll=False):
         assert isinstance(fpath, str)
-        super().__init__(FileStream(fpath))
-
-    def parse(self):
-        return self.fileInput()
+        super().__init__(FileStream(fpath), force_ll)
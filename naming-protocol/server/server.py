@@ -0,0 +1,90 @@
+import io
+import json
+import os
+import socketserver
+import stat
+from ..model import Context, ModuleBuilder, RecordExporter
+from ..execution import ExecutionModel
+
+
+__all__ = [
+    'Daemon'
+]
+
+
+class Daemon:
+    """
+    Runs input programs against a snapshot of the dependencies, loaded once.
+
+    Requests and responses are JSON objects, one per line. A request carries
+    the program text in 'source' and may pick an output 'format' among text,
+    ndjson, csv and tsv. The response carries 'ok', the captured 'output' and,
+    on failure, the 'error' message.
+
+    Each request gets a fresh ModuleBuilder over the frozen snapshot, so its
+    assignments shadow the dependency names without copying or changing them.
+    A write into a dependency, as in g['k'] = 'v', goes to a copy of each
+    container on the way that the request binds for itself, see Model.thaw;
+    another dependency name holding the same entity keeps reading the
+    original. The model and its memo tables are shared between requests.
+    """
+
+    def __init__(self, model, base, parse, show_depth=None, show_entries=None):
+        self.model = model
+        self.base = base
+        self.parse = parse
+        self.show_depth = show_depth
+        self.show_entries = show_entries
+
+    def run(self, source, output, record_format='text'):
+        if record_format == 'text':
+            exporter = None
+        else:
+            exporter = RecordExporter(output, record_format)
+        context = Context(ModuleBuilder(self.base))
+        execution_model = ExecutionModel(self.model, context, show_depth=self.show_depth, show_entries=self.show_entries, exporter=exporter, output=output)
+        try:
+            for stmt in self.parse(source):
+                execution_model.visit(stmt)
+        finally:
+            if exporter is not None:
+                exporter.close()
+
+    def handle(self, line):
+        output = io.StringIO()
+        try:
+            request = json.loads(line)
+            self.run(request['source'], output, request.get('format', 'text'))
+        except Exception as exc_value:
+            return {'ok': False, 'output': output.getvalue(), 'error': '{:s}: {:s}'.format(type(exc_value).__name__, str(exc_value))}
+        return {'ok': True, 'output': output.getvalue()}
+
+    def serve_stream(self, reader, writer):
+        for line in reader:
+            if line.strip():
+                writer.write(json.dumps(self.handle(line)) + '\n')
+                writer.flush()
+
+    def serve_unix(self, path):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if line.strip():
+                        self.wfile.write((json.dumps(daemon.handle(line.decode())) + '\n').encode())
+
+        # Only a socket left by an earlier daemon is replaced, never a regular file.
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError('\'{:s}\' exists and is not a socket.'.format(path))
+            os.remove(path)
+        with socketserver.UnixStreamServer(path, Handler) as server:
+            try:
+                server.serve_forever()
+            finally:
+                os.remove(path)
@@ -0,0 +1,271 @@
+import os
+import sys
+import time
+from ..ast import ASTNode, GroupStmtNode, ScopeStmtNode, NameAtomNode, NameSubscriptNode
+from ..model import Context, ModuleBuilder
+
+
+__all__ = [
+    'WatchedFile',
+    'Watcher'
+]
+
+
+class WatchedFile:
+    """
+    A source file with its top-level statements, reparsed incrementally on change.
+
+    The file is only cut between top-level statements at lines known to end
+    the statements before and start the ones after, see get_cuts. After an
+    edit, the statements before the last cut in the unchanged head of the file
+    and after the first cut in the unchanged tail are kept, those of the tail
+    with their line numbers shifted, and only the lines in between are parsed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = None
+        self.lines = []
+        self.stmts = []
+
+    def get_signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        try:
+            signature = self.get_signature()
+        except OSError:
+            # Editors may replace the file instead of writing it in place.
+            return False
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def reload(self, parse):
+        """
+        Reparses the file and returns (start, stop, count): the statements
+        start to stop of the previous parse were replaced by count new ones.
+        """
+        with open(self.path, 'r') as f:
+            lines = f.read().splitlines(True)
+        old_count = len(self.stmts)
+        try:
+            start, stop, stmts = self.parse_changes(parse, lines)
+        except Exception:
+            # Let a full parse either recover or raise the real error.
+            start, stop, stmts = 0, old_count, list(parse(''.join(lines)))
+        self.stmts[start:stop] = stmts
+        self.lines = lines
+        return start, stop, len(stmts)
+
+    def get_cuts(self):
+        """
+        Returns (line, index) pairs: the statements before index end before
+        line, and the ones from index on start at line or after it.
+
+        A block statement is numbered by its first line. A small statement is
+        numbered by the line of the NEWLINE ending it, which takes in the blank
+        and comment lines after it, so the next statement starts on the line
+        after it, unless both share a line. Where a small statement follows a
+        block, the end of the block is not known, and there is no cut.
+        """
+        cuts = [(1, 0)]
+        for index in range(1, len(self.stmts)):
+            previous, stmt = self.stmts[index - 1], self.stmts[index]
+            if is_block(stmt):
+                cuts.append((stmt.line_index, index))
+            elif not is_block(previous) and previous.line_index < stmt.line_index:
+                cuts.append((previous.line_index + 1, index))
+        cuts.append((len(self.lines) + 1, len(self.stmts)))
+        return cuts
+
+    def parse_changes(self, parse, lines):
+        old_lines = self.lines
+        limit = min(len(old_lines), len(lines))
+        head = 0
+        while head < limit and old_lines[head] == lines[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old_lines[len(old_lines) - 1 - tail] == lines[len(lines) - 1 - tail]:
+            tail += 1
+        if head == len(old_lines) and head == len(lines):
+            return 0, 0, []
+
+        # The last cut with only unchanged lines before it and the first with only unchanged lines from it on, or
+        # either end of the file. The line of a cut other than the first starts a statement, which ends the lines
+        # the statement before it takes in, so the first changed line has to start one as well. The last statement
+        # of the file leaves out a trailing blank line, so the end of the file never starts the parsed lines.
+        cuts = self.get_cuts()
+        if head < len(lines) and is_stmt_line(lines[head]):
+            head += 1
+        first_line, start = [cut for cut in cuts[:-1] if cut[0] <= max(head, 1)][-1]
+        last_line, stop = [cut for cut in cuts[1:] if cut[0] > len(old_lines) - tail and cut[1] >= start][0]
+
+        delta = len(lines) - len(old_lines)
+        stmts = list(parse(''.join(lines[first_line - 1:last_line - 1 + delta])))
+        for stmt in stmts:
+            shift_lines(stmt, first_line - 1)
+        if stmts and stop < len(self.stmts):
+            # At the end of the parsed lines, the last small statements did not take in the lines up to the next statement.
+            line_index = stmts[-1].line_index
+            for stmt in reversed(stmts):
+                if is_block(stmt) or stmt.line_index != line_index:
+                    break
+                stmt.line_index = last_line - 1 + delta
+        for stmt in self.stmts[stop:]:
+            shift_lines(stmt, delta)
+        return start, stop, stmts
+
+
+class Watcher:
+    """
+    Runs the watched files as one program and re-executes only what an edit affects.
+
+    Every top-level statement runs in its own ModuleBuilder over the names
+    bound by the statements before it, and the names it binds are kept as its
+    delta. After an edit, execution restarts from the first changed statement
+    with the names folded from the deltas before it. A later statement runs
+    again only if it is new, failed, or mentions a name whose entity changed;
+    the others just contribute their old delta. This relies on the
+    entities never changing once bound: in the mutable model the delta of a
+    statement is frozen after it runs, so later writes go to copies.
+    """
+
+    def __init__(self, files, parse, execution_model, interval=0.5):
+        self.files = files
+        self.parse = parse
+        self.execution_model = execution_model
+        self.interval = interval
+        self.records = []
+        self.failed = None
+        self.dirty = set()
+
+    def get_offset(self, watched_file):
+        offset = 0
+        for other in self.files:
+            if other is watched_file:
+                return offset
+            offset += len(other.stmts)
+
+    def update(self, changed):
+        """
+        Reloads the changed files and re-executes the affected statements. Returns the number of statements executed.
+        """
+        first = len(self.records)
+        if self.failed is not None:
+            first = self.records.index(self.failed)
+        dirty = self.dirty
+        for watched_file in changed:
+            offset = self.get_offset(watched_file)
+            try:
+                start, stop, count = watched_file.reload(self.parse)
+            except Exception as exc_value:
+                print(exc_value, file=self.execution_model.get_stream())
+                continue
+            for record in self.records[offset + start:offset + stop]:
+                if record.delta is not None:
+                    dirty.update(record.delta)
+            self.records[offset + start:offset + stop] = [StmtRecord(stmt, watched_file.path) for stmt in watched_file.stmts[start:start + count]]
+            first = min(first, offset + start)
+        return self.execute(first, dirty)
+
+    def execute(self, first, dirty):
+        """
+        Runs the records from first on. When a statement fails, the ones after
+        it keep their old deltas, and the names changed so far stay dirty for
+        the next update, which resumes at the failed statement.
+        """
+        names = {}
+        for record in self.records[:first]:
+            names.update(record.delta)
+
+        executed = 0
+        for record in self.records[first:]:
+            if record.delta is not None and record.reads.isdisjoint(dirty):
+                names.update(record.delta)
+                continue
+
+            old_delta = record.delta or {}
+            module_builder = ModuleBuilder(names)
+            self.execution_model.context = Context(module_builder)
+            self.execution_model.filename = record.filename
+            try:
+                self.execution_model.visit(record.stmt)
+            except Exception as exc_value:
+                print(exc_value, file=self.execution_model.get_stream())
+                record.delta = None
+                self.failed = record
+                self.dirty = dirty.union(old_delta)
+                return executed
+            executed += 1
+            record.delta = dict(module_builder.nvmap)
+            if not self.execution_model.model.immutable:
+                for value in record.delta.values():
+                    value.freeze()
+            for name in {*record.delta, *old_delta}:
+                if old_delta.get(name) is not record.delta.get(name):
+                    dirty.add(name)
+            names.update(record.delta)
+        self.failed = None
+        self.dirty = set()
+        return executed
+
+    def flush(self):
+        if self.execution_model.exporter is not None:
+            self.execution_model.exporter.flush()
+        self.execution_model.get_stream().flush()
+
+    def run(self):
+        for watched_file in self.files:
+            watched_file.poll()
+        self.update(self.files)
+        self.flush()
+        while True:
+            time.sleep(self.interval)
+            changed = [watched_file for watched_file in self.files if watched_file.poll()]
+            if changed:
+                started = time.perf_counter()
+                executed = self.update(changed)
+                self.flush()
+                print('Updated {:s}: {:d} statements executed in {:.3f} seconds.'.format(', '.join(watched_file.path for watched_file in changed), executed, time.perf_counter() - started), file=sys.stderr)
+
+
+class StmtRecord:
+    def __init__(self, stmt, filename=None):
+        self.stmt = stmt
+        self.filename = filename
+        self.reads = collect_names(stmt, set())
+        self.delta = None
+
+
+def collect_names(node, names):
+    """
+    Adds every name the node mentions, which over-approximates the module names it reads.
+    """
+    if isinstance(node, NameAtomNode) or isinstance(node, NameSubscriptNode):
+        names.add(node.name)
+    if isinstance(node, ASTNode):
+        for value in vars(node).values():
+            collect_names(value, names)
+    elif isinstance(node, list) or isinstance(node, tuple):
+        for value in node:
+            collect_names(value, names)
+    return names
+
+
+def is_stmt_line(line):
+    line = line.strip()
+    return line != '' and not line.startswith('#')
+
+
+def is_block(stmt):
+    return isinstance(stmt, GroupStmtNode) or isinstance(stmt, ScopeStmtNode)
+
+
+def shift_lines(stmt, delta):
+    stmt.line_index += delta
+    if is_block(stmt):
+        for child in stmt.children:
+            shift_lines(child, delta)
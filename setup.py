@@ -1,7 +1,7 @@
 from setuptools import setup
 
 setup(name='NamingProtocol',
-      version='0.0.0.1',
+      version='0.0.0.2',
       description='A python implementation of NamingProtocol, a language for naming classes, methods and variables.',
       url='https://github.com/try-skycn/NamingProtocol',
       author='Tianyao Chen',
@@ -0,0 +1,49 @@
+import importlib
+import os
+import sys
+import zlib
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+cache_module = importlib.import_module('naming-protocol.cache.cache')
+fastparser = importlib.import_module('naming-protocol.fastparser')
+
+
+SOURCE = b"a = {'k': 'v'}\nshow a + 'x'\n"
+
+
+def test_round_trip(tmp_path):
+    cache = cache_module.ASTCache(str(tmp_path))
+    key = cache.get_key(SOURCE, 'fast')
+    assert cache.load(key) is None
+    stmts = fastparser.FastStringParser(SOURCE.decode()).parse()
+    assert cache.store(key, stmts)
+    loaded = cache.load(key)
+    assert [type(stmt) for stmt in loaded] == [type(stmt) for stmt in stmts]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_depends_on_parser_and_sources(monkeypatch, tmp_path):
+    cache = cache_module.ASTCache(str(tmp_path))
+    key = cache.get_key(SOURCE, 'fast')
+    assert key != cache.get_key(SOURCE, 'antlr')
+    monkeypatch.setattr(cache_module, 'SOURCE_DIGEST', 'changed')
+    assert key != cache.get_key(SOURCE, 'fast')
+
+
+def test_damaged_entries_are_misses(tmp_path):
+    cache = cache_module.ASTCache(str(tmp_path))
+    for index, data in enumerate([b'garbage', cache_module.MAGIC + b'not zlib', cache_module.MAGIC + zlib.compress(b'not a pickle')]):
+        key = cache.get_key(SOURCE + str(index).encode())
+        os.makedirs(os.path.dirname(cache.get_path(key)), exist_ok=True)
+        with open(cache.get_path(key), 'wb') as f:
+            f.write(data)
+        assert cache.load(key) is None
+    assert cache.misses == 3
+
+
+def test_unpicklable_statements_are_not_stored(tmp_path):
+    cache = cache_module.ASTCache(str(tmp_path))
+    assert not cache.store(cache.get_key(SOURCE), [lambda: None])
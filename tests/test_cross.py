@@ -0,0 +1,58 @@
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+error = importlib.import_module('naming-protocol.error')
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+def run(source, immutable=False):
+    output = io.StringIO()
+    context = model_module.Context(model_module.ModuleBuilder())
+    execution_model = execution.ExecutionModel(model_module.Model(immutable), context, output=output)
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    return context, output.getvalue()
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_cross_of_mutable_operands_is_lazy(immutable):
+    context, output = run("a = {'k': 'x', 'l': 'y'}\nb = {'m': 'p'}\nc = a + b @ '_'\n", immutable)
+    entity = context.get_by_name('c')
+    assert isinstance(entity, model_module.CrossGroupEntity) and entity.is_lazy()
+    assert entity.get_lengths() == [2, 1]
+
+
+def test_later_writes_to_operands_do_not_show_through():
+    source = "a = {'k': 'x'}\nb = {'m': 'p'}\nc = a + b @ '_'\na['z'] = 'w'\nb['m'] = 'q'\nshow c\n"
+    context, output = run(source)
+    assert "'x_p'" in output and "'x_q'" not in output and "['z']" not in output
+
+
+def test_lazy_cross_result_can_be_assigned_into():
+    context, output = run("a = {'k': 'x'}\nb = {'m': 'p'}\nc = a + b @ '_'\nc['k']['m'] = 'q'\nc['z'] = 'w'\nshow c\n")
+    assert "['k'] Group" in output and "'q'" in output and "['z']" in output and "'x_p'" not in output
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_mismatched_cross_fails_in_its_statement(immutable):
+    with pytest.raises(error.StmtError) as exc_info:
+        run("v0 = {'n': 'a'}\nshow (v0 + <v0, past=v0> @ '')\n", immutable)
+    assert exc_info.value.node.line_index == 2
+    assert isinstance(exc_info.value.exc_value, error.RightExprError)
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_mismatched_cross_fails_in_its_assignment(immutable):
+    with pytest.raises(error.StmtError) as exc_info:
+        run("v0 = {'n': 'a'}\nv1 = <2> + <v0, past=v0> @ ''\nshow v1\n", immutable)
+    assert exc_info.value.node.line_index == 2
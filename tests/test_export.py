@@ -0,0 +1,59 @@
+import csv
+import importlib
+import io
+import json
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+SOURCE = "g = {'a': 'x,y', 'b': 'q\"\tt'}\nshow g\nscope s begin\n    use g\n    validate\nend\n"
+
+RECORDS = [
+    {'event': 'show', 'line': 2, 'statement': 0, 'scope': None, 'path': '', 'index': 'x-', 'type': 'group', 'content': None},
+    {'event': 'show', 'line': 2, 'statement': 0, 'scope': None, 'path': '[\'a\']', 'index': 'x0', 'type': 'content', 'content': 'x,y'},
+    {'event': 'show', 'line': 2, 'statement': 0, 'scope': None, 'path': '[\'b\']', 'index': 'x1', 'type': 'content', 'content': 'q"\tt'},
+    {'event': 'validate', 'line': 5, 'statement': 0, 'scope': 's', 'path': None, 'index': None, 'type': None, 'content': 'x,y'},
+    {'event': 'validate', 'line': 5, 'statement': 0, 'scope': 's', 'path': None, 'index': None, 'type': None, 'content': 'q"\tt'}
+]
+
+
+def export(record_format, chunk_size=1 << 16):
+    stream = io.StringIO()
+    exporter = model_module.RecordExporter(stream, record_format, chunk_size)
+    execution_model = execution.ExecutionModel(model_module.Model(False), model_module.Context(model_module.ModuleBuilder()), exporter=exporter, output=io.StringIO())
+    for stmt in fastparser.FastStringParser(SOURCE).parse():
+        execution_model.visit(stmt)
+    written = stream.getvalue()
+    exporter.close()
+    return written, stream.getvalue()
+
+
+def test_ndjson():
+    _, text = export('ndjson')
+    assert [json.loads(line) for line in text.splitlines()] == RECORDS
+
+
+@pytest.mark.parametrize('record_format, delimiter', [('csv', ','), ('tsv', '\t')])
+def test_csv_and_tsv(record_format, delimiter):
+    _, text = export(record_format)
+    rows = list(csv.DictReader(io.StringIO(text, newline=''), delimiter=delimiter))
+    assert list(rows[0]) == model_module.export.FIELDS
+    expected = [{field: '' if value is None else str(value) for field, value in record.items()} for record in RECORDS]
+    assert rows == expected
+
+
+def test_records_are_written_in_chunks():
+    written, text = export('ndjson')
+    assert written == ''
+    written, chunked = export('ndjson', 1)
+    assert written == chunked == text
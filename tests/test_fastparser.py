@@ -0,0 +1,111 @@
+import functools
+import glob
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, 'tests', 'corpus')
+GRAMMAR = os.path.join(ROOT, 'naming-protocol', 'grammar')
+VALID = sorted(glob.glob(os.path.join(CORPUS, 'valid', '*.np')))
+INVALID = sorted(glob.glob(os.path.join(CORPUS, 'invalid', '*.np')))
+
+sys.path.insert(0, ROOT)
+ast = importlib.import_module('naming-protocol.ast')
+error = importlib.import_module('naming-protocol.error')
+fastparser = importlib.import_module('naming-protocol.fastparser')
+
+
+def read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def dump(node):
+    """
+    Turns an AST into nested tuples of class names and attributes, so two trees compare by value.
+    """
+    if isinstance(node, ast.ASTNode):
+        return type(node).__name__, tuple((name, dump(value)) for name, value in sorted(vars(node).items()))
+    elif isinstance(node, list) or isinstance(node, tuple):
+        return tuple(dump(value) for value in node)
+    else:
+        return node
+
+
+@functools.cache
+def generate_grammar():
+    """
+    Runs grammar/compile.sh, so the differential tests check the ANTLR parser
+    built from the current grammar rather than skipping without it.
+    """
+    try:
+        result = subprocess.run(['sh', 'compile.sh'], cwd=GRAMMAR, capture_output=True, text=True, timeout=600)
+    except (OSError, subprocess.TimeoutExpired) as exc_value:
+        return str(exc_value)
+    return result.stdout + result.stderr if result.returncode != 0 else None
+
+
+def load_antlr():
+    try:
+        importlib.import_module('antlr4')
+    except ImportError:
+        pytest.fail('The differential tests need the antlr4-python3-runtime package.')
+    try:
+        return importlib.import_module('naming-protocol.parser'), importlib.import_module('naming-protocol.cst2ast')
+    except ImportError:
+        pass
+    message = generate_grammar()
+    if message is not None:
+        pytest.fail('Could not generate the ANTLR parser with grammar/compile.sh:\n{:s}'.format(message))
+    for name in list(sys.modules):
+        if name.startswith('naming-protocol.grammar') or name.startswith('naming-protocol.parser') or name.startswith('naming-protocol.cst2ast'):
+            del sys.modules[name]
+    return importlib.import_module('naming-protocol.parser'), importlib.import_module('naming-protocol.cst2ast')
+
+
+def parse_antlr(source):
+    parser_module, cst2ast = load_antlr()
+    parser = parser_module.StringParser(source)
+    parser.removeErrorListeners()
+    tree = parser.parse()
+    return parser, cst2ast.CST2AST(parser.input_stream).visit(tree)
+
+
+@pytest.mark.parametrize('path', VALID, ids=os.path.basename)
+def test_fast_parser_accepts(path):
+    assert fastparser.FastStringParser(read(path)).parse()
+
+
+@pytest.mark.parametrize('path', INVALID, ids=os.path.basename)
+def test_fast_parser_rejects(path):
+    with pytest.raises(error.ParseError):
+        fastparser.FastStringParser(read(path)).parse()
+
+
+@pytest.mark.parametrize('path', VALID, ids=os.path.basename)
+def test_fast_parser_streams_same_ast(path):
+    streamed = list(fastparser.FastFileParser(path).file_input())
+    assert dump(streamed) == dump(fastparser.FastStringParser(read(path)).parse())
+
+
+@pytest.mark.parametrize('path', VALID, ids=os.path.basename)
+def test_matches_antlr(path):
+    source = read(path)
+    parser, stmts = parse_antlr(source)
+    assert parser.getNumberOfSyntaxErrors() == 0
+    assert dump(fastparser.FastStringParser(source).parse()) == dump(stmts)
+
+
+@pytest.mark.parametrize('path', INVALID, ids=os.path.basename)
+def test_antlr_rejects(path):
+    parser_module, cst2ast = load_antlr()
+    try:
+        parser, stmts = parse_antlr(read(path))
+    except Exception:
+        return
+    assert parser.getNumberOfSyntaxErrors() > 0
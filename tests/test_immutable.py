@@ -0,0 +1,88 @@
+import importlib
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+error = importlib.import_module('naming-protocol.error')
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+def run(source, immutable=True):
+    output = io.StringIO()
+    context = model_module.Context(model_module.ModuleBuilder())
+    execution_model = execution.ExecutionModel(model_module.Model(immutable), context, output=output)
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    return context, output.getvalue()
+
+
+@pytest.mark.parametrize('source, message', [
+    ("g = {'k': 'a'}\ng['z'] = 'b'\n", "Cannot set ['z'] of a frozen group"),
+    ("g = {'k': {'j': 'a'}}\ng['k']['j'] = 'b'\n", "Cannot set ['j'] of a frozen group"),
+    ("i = <'a', p='b'>\ni.q = 'c'\n", 'Cannot set [q] of a frozen individual'),
+])
+def test_writes_into_built_entities_are_rejected(source, message):
+    with pytest.raises(error.StmtError) as exc_info:
+        run(source)
+    assert isinstance(exc_info.value.exc_value, error.FrozenEntityError)
+    assert str(exc_info.value.exc_value).startswith(message)
+
+
+def test_same_writes_work_in_mutable_mode():
+    context, output = run("g = {'k': {'j': 'a'}}\ng['k']['j'] = 'b'\ng['z'] = 'c'\nshow g\n", immutable=False)
+    assert "['j'] x00 'b'" in output and "['z'] x1 'c'" in output
+
+
+def test_binding_a_name_again_is_not_a_write():
+    context, output = run("g = {'k': 'a'}\ng = g | {'z': 'b'}\nshow g\n")
+    assert "['z'] x1 'b'" in output
+
+
+def test_threads_share_interned_contents():
+    barrier = threading.Barrier(4)
+    results = []
+
+    def intern():
+        barrier.wait()
+        results.append([model_module.entity.intern_content_entity('c{:d}'.format(i)) for i in range(2000)])
+
+    threads = [threading.Thread(target=intern) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(entity is other for row in results for entity, other in zip(row, results[0]))
+
+
+def test_snapshot_queries_from_threads():
+    module_builder = model_module.ModuleBuilder()
+    execution_model = execution.ExecutionModel(model_module.Model(True), model_module.Context(module_builder), output=io.StringIO())
+    for stmt in fastparser.FastStringParser("g = {'k': 'a', 'l': <3>}\nh = g + g @ '_'\n").parse():
+        execution_model.visit(stmt)
+    snapshot = model_module.ModuleSnapshot(module_builder)
+    source = "i = h + {'m': 'b'}\nshow i\n"
+    outputs = []
+
+    def query():
+        output = io.StringIO()
+        query_model = execution.ExecutionModel(snapshot.get_model(), snapshot.create_context(), output=output)
+        for stmt in fastparser.FastStringParser(source).parse():
+            query_model.visit(stmt)
+        outputs.append(output.getvalue())
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(outputs) == 4 and len(set(outputs)) == 1 and "['m']" in outputs[0]
+    assert 'i' not in snapshot
@@ -0,0 +1,66 @@
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+def write_table(path):
+    builder = model_module.NameTableBuilder()
+    builder.add(['s'], ['b', 'a', 'ab', 'é', 'z'])
+    builder.add(['s', 't'], ['a', 'abc'])
+    builder.add(['u'], [])
+    builder.write(str(path))
+    return str(path)
+
+
+def test_round_trip(tmp_path):
+    with model_module.NameTable(write_table(tmp_path / 'names.npt')) as table:
+        assert len(table) == 7
+        assert 'a' in table and 'é' in table and 'abc' in table
+        assert 'c' not in table and '' not in table and 'abcd' not in table
+        assert table.get_scopes('a') == ['s', 's.t']
+        assert table.get_scopes('z') == ['s'] and table.get_scopes('y') == []
+        assert list(table.iterate_prefix('ab')) == [('ab', 's'), ('abc', 's.t')]
+        assert [name for name, _ in table.iterate_prefix('')] == ['a', 'a', 'ab', 'abc', 'b', 'z', 'é']
+
+
+def test_names_validated_by_a_program(tmp_path):
+    builder = model_module.NameTableBuilder()
+    execution_model = execution.ExecutionModel(model_module.Model(False), model_module.Context(model_module.ModuleBuilder()), name_table=builder, output=io.StringIO())
+    source = "a = {'k': 'x', 'l': 'y'}\nscope s begin\n    use a\n    validate\n    scope t begin\n        use {'m': 'z'}\n        validate\n    end\nend\n"
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    builder.write(str(tmp_path / 'names.npt'))
+    with model_module.NameTable(str(tmp_path / 'names.npt')) as table:
+        assert list(table.iterate_prefix('')) == [('x', 's'), ('y', 's'), ('z', 's.t')]
+
+
+def test_rewrite_replaces_the_file(tmp_path):
+    path = write_table(tmp_path / 'names.npt')
+    builder = model_module.NameTableBuilder()
+    builder.add(['v'], ['q'])
+    builder.write(path)
+    with model_module.NameTable(path) as table:
+        assert list(table.iterate_prefix('')) == [('q', 'v')]
+    assert os.listdir(str(tmp_path)) == ['names.npt']
+
+
+@pytest.mark.parametrize('cut', [0, 4, 20, -1])
+def test_bad_files_are_rejected(tmp_path, cut):
+    path = write_table(tmp_path / 'names.npt')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(b'not a name table' if cut == 0 else data[:cut])
+    with pytest.raises(ValueError):
+        model_module.NameTable(path)
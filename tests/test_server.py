@@ -0,0 +1,74 @@
+import importlib
+import io
+import json
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+server = importlib.import_module('naming-protocol.server')
+
+
+DEPENDENCY = "g = {'k': {'j': 'a'}, 'l': 'b'}\nh = <2>\ni = {'m': {'n': 'o'}}\n"
+PROGRAM = "g['z'] = 'c'\ng['k']['i'] = 'd'\ni['m']['y'] = 'e'\nshow g\nshow i\nx = g + h @ '_'\nscope s begin\n    use x\n    validate\nend\n"
+
+
+def parse(source):
+    return fastparser.FastStringParser(source).parse()
+
+
+def run_cli(source, immutable=False):
+    model = model_module.Model(immutable)
+    context = model_module.Context(model_module.ModuleBuilder())
+    for stmt in parse(DEPENDENCY):
+        execution.ExecutionModel(model, context, output=io.StringIO()).visit(stmt)
+    output = io.StringIO()
+    execution_model = execution.ExecutionModel(model, context, output=output)
+    for stmt in parse(source):
+        execution_model.visit(stmt)
+    return output.getvalue()
+
+
+def create_daemon(immutable=False):
+    model = model_module.Model(immutable)
+    module_builder = model_module.ModuleBuilder()
+    execution_model = execution.ExecutionModel(model, model_module.Context(module_builder), output=io.StringIO())
+    for stmt in parse(DEPENDENCY):
+        execution_model.visit(stmt)
+    return server.Daemon(model, module_builder.snapshot(), parse)
+
+
+def test_daemon_runs_programs_like_the_cli():
+    daemon = create_daemon()
+    expected = run_cli(PROGRAM)
+    assert "['z'] x20 'c'" in expected and "['i'] x01 'd'" in expected and "['y'] x01 'e'" in expected
+    for _ in range(2):
+        assert daemon.handle(json.dumps({'source': PROGRAM})) == {'ok': True, 'output': expected}
+
+
+def test_writes_into_dependencies_stay_in_their_request():
+    daemon = create_daemon()
+    source = 'show g\nshow i\n'
+    before = daemon.handle(json.dumps({'source': source}))
+    daemon.handle(json.dumps({'source': PROGRAM}))
+    assert daemon.handle(json.dumps({'source': source})) == before
+    assert "'c'" not in before['output'] and "'e'" not in before['output']
+
+
+def test_immutable_daemon_rejects_writes_into_dependencies():
+    response = create_daemon(True).handle(json.dumps({'source': "g['z'] = 'c'\n"}))
+    assert not response['ok'] and 'StmtError' in response['error']
+    with pytest.raises(Exception):
+        run_cli("g['z'] = 'c'\n", True)
+
+
+def test_record_formats():
+    response = create_daemon().handle(json.dumps({'source': 'show h\n', 'format': 'ndjson'}))
+    assert [json.loads(line)['content'] for line in response['output'].splitlines()] == [None, 'x0', 'x1']
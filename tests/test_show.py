@@ -0,0 +1,82 @@
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+def setup(source):
+    model = model_module.Model(False)
+    context = model_module.Context(model_module.ModuleBuilder())
+    execution_model = execution.ExecutionModel(model, context, output=io.StringIO())
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    return model, context
+
+
+GROUP = "g = {'a': {'b': 'x', 'c': 'y'}, 'd': 'z'}\n"
+
+
+@pytest.mark.parametrize('max_depth, max_entries, expected', [
+    (None, None, [
+        '- <START> Group x--',
+        '  - [\'a\'] Group x0-',
+        '    - [\'b\'] x00 \'x\'',
+        '    - [\'c\'] x01 \'y\'',
+        '  - [\'d\'] x10 \'z\''
+    ]),
+    (0, None, [
+        '- <START> Group x'
+    ]),
+    (1, None, [
+        '- <START> Group x-',
+        '  - [\'a\'] Group x0',
+        '  - [\'d\'] x1 \'z\''
+    ]),
+    (None, 1, [
+        '- <START> Group x',
+        '  - [\'a\'] Group x0',
+        '    - [\'b\'] x00 \'x\'',
+        '    - ...',
+        '  - ...'
+    ])
+])
+def test_render_limits(max_depth, max_entries, expected):
+    model, context = setup(GROUP)
+    assert ''.join(model.render(context.get_by_name('g'), max_depth, max_entries)).splitlines() == expected
+
+
+def test_walk_marks_cuts_and_paths():
+    model, context = setup(GROUP)
+    entries = [(indent, label, path, entity is None) for entity, _, _, indent, label, path in model.walk(context.get_by_name('g'), None, 1)]
+    assert entries == [
+        (0, '<START>', '', False),
+        (1, '[\'a\']', '[\'a\']', False),
+        (2, '[\'b\']', '[\'a\'][\'b\']', False),
+        (2, None, '[\'a\']', True),
+        (1, None, '', True)
+    ]
+
+
+def test_index_width_follows_the_listed_entries():
+    model, context = setup('l = <20>\n')
+    lines = ''.join(model.render(context.get_by_name('l'), None, 16)).splitlines()
+    assert lines[0] == '- <START> List x-' and lines[-2] == '  - [15] xF \'xF\'' and lines[-1] == '  - ...'
+    lines = ''.join(model.render(context.get_by_name('l'), None, 17)).splitlines()
+    assert lines[0] == '- <START> List x--' and lines[-2] == '  - [16] x10 \'x10\''
+
+
+def test_show_writes_to_the_given_output():
+    model, context = setup(GROUP)
+    output = io.StringIO()
+    model.show(context.get_by_name('g'), 1, None, output)
+    assert output.getvalue() == ''.join(model.render(context.get_by_name('g'), 1))
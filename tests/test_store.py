@@ -0,0 +1,137 @@
+import importlib
+import io
+import os
+import pickle
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+error = importlib.import_module('naming-protocol.error')
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+DEPENDENCY = "g = {'k': {'j': 'a'}, 'é': 'b'}\nh = <2>\ni = <'c', p='d', q=g>\nn = h + {'m': 'o'} @ '_'\n"
+PROGRAM = "show g\nshow i\nshow n\nx = g + h @ '_'\nscope s begin\n    use x\n    use n\n    validate\nend\nshow x['k']\nshow i.q['é']\n"
+
+
+def run(source, module_builder, immutable=False):
+    output = io.StringIO()
+    execution_model = execution.ExecutionModel(model_module.Model(immutable), model_module.Context(module_builder), output=output)
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    return output.getvalue()
+
+
+def build_store():
+    module_builder = model_module.ModuleBuilder()
+    run(DEPENDENCY, module_builder)
+    store_builder = model_module.EntityStoreBuilder()
+    store_builder.add_names(module_builder.snapshot())
+    return store_builder
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_stored_names_run_like_the_originals(tmp_path, immutable):
+    module_builder = model_module.ModuleBuilder()
+    run(DEPENDENCY, module_builder, immutable)
+    expected = run(PROGRAM, module_builder, immutable)
+    path = str(tmp_path / 'names.npes')
+    build_store().write(path)
+    with model_module.EntityStore.open(path) as store:
+        assert sorted(store) == ['g', 'h', 'i', 'n']
+        assert run(PROGRAM, model_module.ModuleBuilder(store), immutable) == expected
+        assert store['i'].get_by_name('q') is store['g'] and store['h'].get_by_index(1) is store['h'].get_by_index(1)
+
+
+def test_writes_into_stored_names_go_to_copies(tmp_path):
+    path = str(tmp_path / 'names.npes')
+    build_store().write(path)
+    with model_module.EntityStore.open(path) as store:
+        output = run("g['z'] = 'c'\ng['k']['y'] = 'd'\nshow g\n", model_module.ModuleBuilder(store))
+        assert "['z'] x20 'c'" in output and "['y'] x01 'd'" in output
+        assert store['g'].length() == 2 and store['g'].get_by_key('k').length() == 1
+        with pytest.raises(error.StmtError):
+            run("g['z'] = 'c'\n", model_module.ModuleBuilder(store), True)
+
+
+def test_stored_names_collide_in_validate(tmp_path):
+    path = str(tmp_path / 'names.npes')
+    build_store().write(path)
+    with model_module.EntityStore.open(path) as store:
+        with pytest.raises(error.StmtError):
+            run("scope s begin\n    use g\n    use {'m': 'a'}\n    validate\nend\n", model_module.ModuleBuilder(store))
+
+
+def test_views_pickle_as_their_node(tmp_path):
+    path = str(tmp_path / 'names.npes')
+    build_store().write(path)
+    store = model_module.EntityStore.open(path)
+    data = pickle.dumps(store['n'])
+    assert len(data) < 200
+    try:
+        assert pickle.loads(data) is model_module.store.get_stored_view(store.locator, store['n'].node_id)
+        model_module.store.STORES[store.locator].close()
+    finally:
+        model_module.store.STORES.pop(store.locator, None)
+        store.close()
+
+
+def run_python(source):
+    return subprocess.run([sys.executable, '-c', textwrap.dedent(source)], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+
+def test_shared_memory_stays_with_its_creator(tmp_path):
+    block = build_store().write_shared_memory()
+    try:
+        with model_module.EntityStore.attach(block.name) as store:
+            expected = run(PROGRAM, model_module.ModuleBuilder(store))
+        result = run_python('''
+            import importlib
+            model_module = importlib.import_module('naming-protocol.model')
+            store = model_module.EntityStore.attach({!r})
+            print(store['g'].length())
+            store.close()
+        '''.format(block.name))
+        assert result.stdout == '2\n' and result.stderr == ''
+        # The process that attached has exited, and the block is still there.
+        with model_module.EntityStore.attach(block.name) as store:
+            assert run(PROGRAM, model_module.ModuleBuilder(store)) == expected
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_pool_workers_read_shared_memory():
+    result = run_python('''
+        import concurrent.futures, importlib
+        model_module = importlib.import_module('naming-protocol.model')
+
+        def count(entity):
+            return entity.length()
+
+        if __name__ == '__main__':
+            module_builder = model_module.ModuleBuilder()
+            execution = importlib.import_module('naming-protocol.execution')
+            fastparser = importlib.import_module('naming-protocol.fastparser')
+            execution_model = execution.ExecutionModel(model_module.Model(), model_module.Context(module_builder))
+            for stmt in fastparser.FastStringParser("g = {'k': 'a', 'l': <3>}\\n").parse():
+                execution_model.visit(stmt)
+            store_builder = model_module.EntityStoreBuilder()
+            store_builder.add_names(module_builder.snapshot())
+            block = store_builder.write_shared_memory()
+            store = model_module.EntityStore.attach(block.name)
+            with concurrent.futures.ProcessPoolExecutor(2) as executor:
+                print(list(executor.map(count, [store['g'], store['g'].get_by_key('l')])))
+            store.close()
+            block.close()
+            block.unlink()
+    ''')
+    assert result.stdout == '[2, 3]\n' and result.stderr == ''
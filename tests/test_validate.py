@@ -0,0 +1,243 @@
+import importlib
+import io
+import os
+import pickle
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+
+
+SOURCE = "a = {'k': 'x', 'l': 'y'}\nb = {'m': 'p'}\nc = {'n': 'x'}\n"
+
+
+def setup(source=SOURCE, immutable=False):
+    model = model_module.Model(immutable)
+    context = model_module.Context(model_module.ModuleBuilder())
+    execution_model = execution.ExecutionModel(model, context, output=io.StringIO())
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    return model, context
+
+
+def count_expansions(monkeypatch, model):
+    expanded = []
+    original = model.expand_batches
+
+    def expand_batches(entities, disabled_set):
+        expanded.extend(entities)
+        return original(entities, disabled_set)
+
+    monkeypatch.setattr(model, 'expand_batches', expand_batches)
+    return expanded
+
+
+def test_validate_expands_only_entities_used_since_the_last_one(monkeypatch):
+    model, context = setup()
+    expanded = count_expansions(monkeypatch, model)
+    scope = context.push_scope_processor('s')
+    scope.use(context.get_by_name('a'))
+    scope.validate(model, False)
+    assert scope.watermark == 1 and scope.emitted == [['x', 'y']]
+    scope.validate(model, False)
+    assert scope.watermark == 1 and len(expanded) == 1
+    scope.use(context.get_by_name('b'))
+    scope.validate(model, False)
+    assert scope.watermark == 2 and scope.emitted == [['x', 'y'], ['p']]
+    assert expanded == [context.get_by_name('a'), context.get_by_name('b')]
+    assert scope.names == {'x', 'y', 'p'}
+
+
+def test_invalidate_resets_the_watermark():
+    model, context = setup()
+    scope = context.push_scope_processor('s')
+    scope.use(context.get_by_name('a'))
+    scope.validate(model, False)
+    scope.invalidate(model, False)
+    assert scope.watermark == 0 and scope.emitted == [] and scope.names == set()
+    scope.use(context.get_by_name('b'))
+    scope.validate(model, False)
+    assert scope.watermark == 2 and scope.names == {'x', 'y', 'p'}
+
+
+def test_names_validated_earlier_still_collide():
+    model, context = setup()
+    scope = context.push_scope_processor('s')
+    scope.use(context.get_by_name('a'))
+    scope.validate(model, False)
+    scope.use(context.get_by_name('c'))
+    with pytest.raises(AssertionError, match='\'x\' already exists'):
+        scope.validate(model, False)
+
+
+def test_symbol_table_counts_names_of_active_scopes():
+    model, context = setup()
+    table = context.top().table
+    outer = context.push_scope_processor('s')
+    outer.use(context.get_by_name('a'))
+    outer.validate(model, False)
+    inner = context.push_scope_processor('t')
+    inner.use(context.get_by_name('b'))
+    inner.validate(model, False)
+    assert table.scope_names == {'x': 1, 'y': 1, 'p': 1}
+    inner.use(context.get_by_name('c'))
+    with pytest.raises(AssertionError, match='\'x\' already exists'):
+        inner.validate(model, False)
+    context.pop()
+    assert table.scope_names == {'x': 1, 'y': 1}
+    outer.remove('x')
+    assert table.scope_names == {'y': 1}
+    context.pop()
+    assert table.scope_names == {}
+
+
+def test_symbol_table_resolves_the_innermost_binding():
+    model, context = setup()
+    module = context.top()
+    table = module.table
+    group = context.push_group_builder('g')
+    group.set_by_name('a', 'inner')
+    assert context.get_by_name('a') == 'inner'
+    assert [holder.depth for holder in table.bindings['a']] == [0, 1]
+    assert module.get_by_name('a') != 'inner'
+    context.pop()
+    assert [holder.depth for holder in table.bindings['a']] == [0]
+    assert 'g' not in table.bindings
+    assert context.get_by_name('a') is module.nvmap['a']
+
+
+def test_symbol_table_falls_back_to_the_base():
+    base = {'d': 'from base'}
+    module = model_module.ModuleBuilder(base)
+    assert module.get_by_name('d') == 'from base'
+    module.set_by_name('d', 'shadowed')
+    assert module.get_by_name('d') == 'shadowed'
+    with pytest.raises(KeyError):
+        module.get_by_name('e')
+
+
+REPEATED = "a = {'k': 'x'}\nscope s begin\n    use a\n    use {'m': 'x', 'n': 'x', 'o': 'y'}\n    validate\nend\n"
+
+
+def run_with_report(source, memory_budget=None):
+    report = model_module.CollisionReport()
+    execution_model = execution.ExecutionModel(model_module.Model(False), model_module.Context(model_module.ModuleBuilder()), report=report, memory_budget=memory_budget, output=io.StringIO())
+    execution_model.filename = 'f.np'
+    for stmt in fastparser.FastStringParser(source).parse():
+        execution_model.visit(stmt)
+    return report
+
+
+def summarize(report):
+    return [(name, [(occurrence.line_index, occurrence.filename, count) for occurrence, count in entries]) for name, entries in report.get_collisions()]
+
+
+def test_report_counts_every_emission():
+    report = run_with_report(REPEATED)
+    assert summarize(report) == [('x', [(3, 'f.np', 1), (4, 'f.np', 2)])]
+    assert list(report.lines())[1:] == [
+        'Name \'x\' defined 3 times:',
+        '  Scope s, file \'f.np\' line 3 statement 0: use a',
+        '  Scope s, file \'f.np\' line 4 statement 0: use {\'m\': \'x\', \'n\': \'x\', \'o\': \'y\'} (2 times)'
+    ]
+
+
+def test_report_counts_the_latest_validate_only():
+    report = run_with_report(REPEATED.replace('    validate\n', '    validate\n    invalidate\n    validate\n'))
+    assert summarize(report) == [('x', [(3, 'f.np', 1), (4, 'f.np', 2)])]
+
+
+def test_report_keeps_names_of_enclosing_scopes_first():
+    report = run_with_report("a = {'k': 'x'}\nscope s begin\n    use a\n    validate\n    scope t begin\n        use a\n        use a\n        validate\n    end\nend\n")
+    assert summarize(report) == [('x', [(3, 'f.np', 1), (6, 'f.np', 1), (7, 'f.np', 1)])]
+    assert len(report) == 1
+
+
+def test_sorted_runs_spill_past_the_budget():
+    runs = model_module.SortedRuns(1)
+    for index, name in enumerate(['b', 'a\tb', 'c\n', 'a']):
+        runs.add(name, 0, index)
+    try:
+        assert len(runs) == 4
+        assert list(runs.merge()) == [('a', 0, 3), ('a\\tb', 0, 1), ('b', 0, 0), ('c\\n', 0, 2)]
+    finally:
+        runs.close()
+
+
+@pytest.mark.parametrize('budget', [1, 1 << 20])
+def test_external_validate_reports_like_the_in_memory_one(budget):
+    source = "a = {'k': 'x', 'l': 'y'}\nscope s begin\n    use a\n    validate\n    scope t begin\n        use {'m': 'y', 'n': 'z'}\n        use {'o': 'x', 'p': 'z'}\n        validate\n    end\nend\n"
+    assert summarize(run_with_report(source, budget)) == sorted(summarize(run_with_report(source)))
+
+
+def test_external_validate_spills_runs_of_each_scope():
+    model, context = setup("a = {'k': 'x', 'l': 'y'}\nb = {'m': 'p', 'n': 'q'}\n")
+    outer = context.push_scope_processor('s')
+    outer.use(context.get_by_name('a'))
+    outer.validate_external(model, False, None, 1)
+    inner = context.push_scope_processor('t')
+    inner.use(context.get_by_name('b'))
+    inner.validate_external(model, False, None, 1)
+    assert len(outer.runs) == 2 and len(inner.runs) == 2
+    inner.use(context.get_by_name('a'))
+    with pytest.raises(AssertionError, match='\'x\' already exists'):
+        inner.validate_external(model, False, None, 1)
+    files = inner.runs.files + outer.runs.files
+    context.pop()
+    context.pop()
+    assert all(f.closed for f in files)
+
+
+class PicklingExecutor:
+    """
+    Runs the work in this process, passing arguments and results through pickle as a process pool would.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def map(self, function, *iterables):
+        results = []
+        for args in zip(*iterables):
+            self.calls += 1
+            results.append(pickle.loads(pickle.dumps(function(*pickle.loads(pickle.dumps(args))))))
+        return results
+
+
+SHARDED = "a = <40>\nb = {'p': 'x', 'q': 'y'}\nc = {'k': 'x1_x', 'l': {'m': 'z'}}\nd = a + b @ '_'\n"
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_sharded_validate_matches_the_serial_one(immutable):
+    results = []
+    for sharded in (False, True):
+        model, context = setup(SHARDED, immutable)
+        report = model_module.CollisionReport()
+        scope = context.push_scope_processor('s')
+        scope.use(context.get_by_name('c'))
+        scope.validate(model, False, report)
+        for name in 'dcdb':
+            scope.use(context.get_by_name(name))
+        if sharded:
+            executor = PicklingExecutor()
+            scope.validate_sharded(model, False, report, executor, 3, min_names=1)
+            assert executor.calls > 1
+        else:
+            scope.validate(model, False, report)
+        results.append((scope.emitted, scope.names, summarize(report)))
+    assert results[0] == results[1]
+
+
+def test_lazy_cross_pickles_as_its_operands():
+    model, context = setup(SHARDED)
+    cross = context.get_by_name('d')
+    copy = pickle.loads(pickle.dumps(cross))
+    assert cross.is_lazy() and copy.is_lazy()
+    assert ''.join(model.render(copy)) == ''.join(model.render(cross))
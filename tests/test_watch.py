@@ -0,0 +1,132 @@
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+fastparser = importlib.import_module('naming-protocol.fastparser')
+model_module = importlib.import_module('naming-protocol.model')
+execution = importlib.import_module('naming-protocol.execution')
+watch = importlib.import_module('naming-protocol.watch')
+
+
+def parse(source):
+    return fastparser.FastStringParser(source).parse()
+
+
+def dump(stmts):
+    return [(type(stmt).__name__, stmt.line_index, stmt.stmtcol_index, stmt.content, dump(getattr(stmt, 'children', []))) for stmt in stmts]
+
+
+def edit(tmp_path, old, new):
+    path = str(tmp_path / 'f.np')
+    with open(path, 'w') as f:
+        f.write(old)
+    watched_file = watch.WatchedFile(path)
+    watched_file.reload(parse)
+    kept = list(watched_file.stmts)
+    with open(path, 'w') as f:
+        f.write(new)
+    start, stop, count = watched_file.reload(parse)
+    assert dump(watched_file.stmts) == dump(parse(new))
+    return start, stop, count, kept, watched_file.stmts
+
+
+BLOCKS = "a = 'x'\ngroup g begin\n    h = 'i'\n\n    j = 'k'\nend\nb = 'y'\n\nscope s begin\n    use a\nend\nc = 'z'\n"
+
+
+@pytest.mark.parametrize('old, new, expected', [
+    ("a = 'x'; b = 'y'\nc = 'w'\n", "a = 'z'; b = 'y'\nc = 'w'\n", (0, 2, 2)),
+    ("a = 'x'\nb = 'y'; c = a\nd = 'w'\n", "a = 'x'\nb = 'v'; c = a\nd = 'w'\n", (1, 3, 2)),
+    ("a = 'x'\nd = {'k': 'v',\n     'l': a}\n\n\nb = 'y'\n", "a = 'x'\nd = {'k': 'v',\n     'l': 'q'}\n\n\nb = 'y'\n", (1, 2, 1)),
+    ("a = 'x'\nb = 'y'\n# note\n\nc = 'z'\n", "a = 'x'\nb = 'y'\n\nc = 'z'\n", (1, 2, 1)),
+    ("a = 'x'\nb = 'y'\nc = 'z'\nd = 'w'\n", "a = 'x'\nb = 'y'\ne = 'v'\nc = 'z'\nd = 'w'\n", (2, 2, 1)),
+    ("a = 'x'\nb = 'y'\nc = 'z'\nd = 'w'\n", "a = 'x'\nb = 'y'\nd = 'w'\n", (2, 3, 0)),
+    (BLOCKS, BLOCKS.replace("j = 'k'", "j = 'l'"), (1, 3, 2)),
+    (BLOCKS, BLOCKS.replace("use a", "use a\n    use b"), (3, 5, 2)),
+    (BLOCKS, BLOCKS.replace("\n\nscope", "\n\n\n\nscope"), (1, 3, 2)),
+    (BLOCKS, "d = 'w'\n" + BLOCKS, (0, 1, 2)),
+    (BLOCKS, BLOCKS + "d = 'w'\n", (3, 5, 3)),
+    ("", "a = 'x'\n", (0, 0, 1)),
+    ("a = 'x'\n", "a = 'x'\n", (0, 0, 0))
+])
+def test_parse_changes_matches_a_full_parse(tmp_path, old, new, expected):
+    start, stop, count, kept, stmts = edit(tmp_path, old, new)
+    assert (start, stop, count) == expected
+    assert stmts[:start] == kept[:start]
+    assert stmts[start + count:] == kept[stop:]
+
+
+def test_statements_sharing_a_line_are_reparsed_together(tmp_path):
+    _, _, _, _, stmts = edit(tmp_path, "a = 'x'; b = 'y'\n", "a = 'z'; b = 'y'\n")
+    assert [(stmt.content, stmt.line_index, stmt.stmtcol_index) for stmt in stmts] == [("a = 'z'", 1, 0), ("b = 'y'", 1, 1)]
+
+
+def test_shift_lines_moves_block_children():
+    stmt, = parse("group g begin\n    h = 'i'\n    group k begin\n        l = 'm'\n    end\nend\n")
+    watch.watch.shift_lines(stmt, 3)
+    assert dump([stmt]) == dump(parse("\n\n\ngroup g begin\n    h = 'i'\n    group k begin\n        l = 'm'\n    end\nend\n"))
+
+
+def test_collect_names():
+    stmts = parse("a = b + c['k'] @ '_'\nd['l'] = e\nscope s begin\n    use f\nend\n")
+    assert [watch.watch.collect_names(stmt, set()) for stmt in stmts] == [{'a', 'b', 'c'}, {'d', 'e'}, {'f'}]
+
+
+def start_watching(tmp_path, source, immutable=False):
+    path = str(tmp_path / 'f.np')
+    with open(path, 'w') as f:
+        f.write(source)
+    output = io.StringIO()
+    execution_model = execution.ExecutionModel(model_module.Model(immutable), model_module.Context(model_module.ModuleBuilder()), output=output)
+    watched_file = watch.WatchedFile(path)
+    watcher = watch.Watcher([watched_file], parse, execution_model)
+    return watcher, output, watcher.update([watched_file])
+
+
+def update(watcher, source):
+    watched_file, = watcher.files
+    with open(watched_file.path, 'w') as f:
+        f.write(source)
+    return watcher.update([watched_file])
+
+
+WATCHED = "a = 'x'\n\nb = 'y'\n\nc = a + b\n\nd = 'z'\n\nshow c\n\nshow d\n"
+
+
+@pytest.mark.parametrize('immutable', [False, True])
+def test_only_statements_reading_changed_names_run_again(tmp_path, immutable):
+    watcher, output, executed = start_watching(tmp_path, WATCHED, immutable)
+    assert executed == 6
+    assert update(watcher, WATCHED.replace("b = 'y'", "b = 'w'")) == 3
+    assert output.getvalue().count('show c') == 2 and output.getvalue().count('show d') == 1
+    assert update(watcher, WATCHED.replace("b = 'y'", "b = 'w'").replace("d = 'z'", "d = 'v'")) == 2
+    assert output.getvalue().count('show c') == 2 and output.getvalue().count('show d') == 2
+
+
+def test_failed_statements_run_again(tmp_path):
+    watcher, output, executed = start_watching(tmp_path, "a = 'x'\n\nb = c\n\nd = a\n\nshow d\n")
+    assert executed == 1 and watcher.failed is watcher.records[1]
+    assert update(watcher, "a = 'x'\n\nb = a\n\nd = a\n\nshow d\n") == 3
+    assert watcher.failed is None and 'show d' in output.getvalue()
+
+
+def test_writes_into_earlier_names_go_to_copies(tmp_path):
+    source = "g = {'k': 'a'}\n\nh = g\n\ng['z'] = 'b'\n\nshow g\n\nshow h\n"
+    watcher, output, executed = start_watching(tmp_path, source)
+    assert executed == 5
+    assert "['z'] x1 'b'" in output.getvalue() and output.getvalue().count("['z']") == 1
+    first = watcher.records[0].delta['g']
+    assert update(watcher, source.replace("'b'", "'c'")) == 2
+    assert watcher.records[0].delta['g'] is first and first.length() == 1
+    assert "['z'] x1 'c'" in output.getvalue()
+
+
+def test_immutable_watch_rejects_writes_into_earlier_names(tmp_path):
+    watcher, _, executed = start_watching(tmp_path, "g = {'k': 'a'}\n\ng['z'] = 'b'\n", True)
+    assert executed == 1 and watcher.failed is watcher.records[1]